@@ -1,7 +1,17 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from models import db
+from typing import Optional
+from sqlalchemy import case, cast, event, func, lambda_stmt, literal_column, select
+from sqlalchemy.dialects.postgresql import JSONB, insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import validates
+from models import db, JSONType
 import json
+import math
+import time
 import numpy as np
 from enum import Enum
 
@@ -20,9 +30,75 @@ class DifficultyLevel(Enum):
     HARD = "hard"
     EXPERT = "expert"
 
+@dataclass(slots=True, frozen=True)
+class QuestionData:
+    """Fields returned by AdaptiveQuestion.to_dict"""
+    id: int
+    topic_id: int
+    course_id: int
+    question_text: str
+    question_type: str
+    difficulty_level: str
+    points: int
+    options: list
+    correct_answer: str
+    explanation: Optional[str]
+    initial_difficulty: float
+    discrimination: float
+    guessing: float
+    time_limit: int
+    tags: list
+    learning_objectives: list
+    created_by: int
+    created_at: Optional[datetime]
+    is_active: bool
+    times_used: int
+    correct_responses: int
+    average_response_time: float
+
+@dataclass(slots=True, frozen=True)
+class AssessmentData:
+    """Fields returned by AdaptiveAssessment.to_dict"""
+    id: int
+    user_id: int
+    course_id: int
+    topic_id: Optional[int]
+    title: str
+    description: Optional[str]
+    assessment_type: str
+    max_questions: int
+    time_limit_minutes: int
+    initial_difficulty: float
+    difficulty_adjustment_rate: float
+    confidence_threshold: float
+    current_question_index: int
+    current_difficulty: float
+    questions_answered: int
+    correct_answers: int
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    time_spent_minutes: int
+    final_score: Optional[float]
+    proficiency_level: Optional[str]
+    confidence_interval: Optional[float]
+    status: str
+
 class AdaptiveQuestion(db.Model):
     """Store adaptive questions with difficulty levels and metadata"""
     __tablename__ = 'adaptive_questions'
+    __table_args__ = (
+        # Candidate lookup in AdaptiveAssessmentEngine.select_next_question;
+        # the trailing difficulty_level also serves get_questions' filter
+        db.Index('ix_aq_topic_course_active_difficulty', 'topic_id', 'course_id', 'is_active', 'difficulty_level'),
+        # GIN indexes for tag/objective containment (@>) filters, PostgreSQL only.
+        # jsonb_path_ops only supports @>, but is about half the size of jsonb_ops.
+        db.Index('adaptive_questions_tags_gin', 'tags',
+                 postgresql_using='gin', postgresql_ops={'tags': 'jsonb_path_ops'},
+                 postgresql_where=db.text('is_active')).ddl_if(dialect='postgresql'),
+        db.Index('adaptive_questions_objectives_gin', 'learning_objectives',
+                 postgresql_using='gin', postgresql_ops={'learning_objectives': 'jsonb_path_ops'},
+                 postgresql_where=db.text('is_active')).ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     topic_id = db.Column(db.Integer, db.ForeignKey('topics.id'), nullable=False)
@@ -30,13 +106,17 @@ class AdaptiveQuestion(db.Model):
     
     # Question content
     question_text = db.Column(db.Text, nullable=False)
-    question_type = db.Column(db.String(50), nullable=False)  # multiple_choice, true_false, etc.
-    difficulty_level = db.Column(db.String(20), nullable=False)  # easy, medium, hard, expert
+    # Native ENUM types on PostgreSQL, VARCHAR with a CHECK constraint elsewhere
+    question_type = db.Column(db.Enum(*[t.value for t in QuestionType], name='question_type',
+                                      create_constraint=True), nullable=False)
+    difficulty_level = db.Column(db.Enum(*[d.value for d in DifficultyLevel], name='difficulty_level',
+                                         create_constraint=True), nullable=False)
     points = db.Column(db.Integer, default=1)
     
     # Question options (JSON for multiple choice)
-    options = db.Column(db.Text, nullable=True)  # JSON array of options
+    options = db.Column(JSONType, nullable=True)  # JSON array of options
     correct_answer = db.Column(db.Text, nullable=False)
+    correct_answer_normalized = db.Column(db.Text, nullable=True)  # Set from correct_answer
     explanation = db.Column(db.Text, nullable=True)
     
     # Adaptive parameters
@@ -46,8 +126,8 @@ class AdaptiveQuestion(db.Model):
     time_limit = db.Column(db.Integer, default=60)  # seconds
     
     # Metadata
-    tags = db.Column(db.Text, nullable=True)  # JSON array of tags
-    learning_objectives = db.Column(db.Text, nullable=True)  # JSON array of objectives
+    tags = db.Column(JSONType, nullable=True)  # JSON array of tags
+    learning_objectives = db.Column(JSONType, nullable=True)  # JSON array of objectives
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
@@ -62,34 +142,73 @@ class AdaptiveQuestion(db.Model):
     course = db.relationship('Course', backref='adaptive_questions')
     creator = db.relationship('User', backref='created_questions')
     
+    # Per-instance memo of get_difficulty_score. The statistics are only
+    # changed by tasks.update_question_statistics, as a SQL UPDATE in its own
+    # session, so an instance never sees them change under its memo.
+    _difficulty_cache = None
+    
+    @staticmethod
+    def normalize_answer(answer):
+        """Normalize an answer for comparison"""
+        return answer.strip().lower()
+    
+    @validates('correct_answer')
+    def _set_correct_answer_normalized(self, key, value):
+        # Normalized once when the answer is set rather than on every submission
+        self.correct_answer_normalized = self.normalize_answer(value) if value is not None else None
+        return value
+    
+    def is_correct_answer(self, answer):
+        """Check a submitted answer against the correct answer"""
+        expected = self.correct_answer_normalized
+        if expected is None:
+            expected = self.normalize_answer(self.correct_answer)
+        return self.normalize_answer(answer) == expected
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'topic_id': self.topic_id,
-            'course_id': self.course_id,
-            'question_text': self.question_text,
-            'question_type': self.question_type,
-            'difficulty_level': self.difficulty_level,
-            'points': self.points,
-            'options': json.loads(self.options) if self.options else [],
-            'correct_answer': self.correct_answer,
-            'explanation': self.explanation,
-            'initial_difficulty': self.initial_difficulty,
-            'discrimination': self.discrimination,
-            'guessing': self.guessing,
-            'time_limit': self.time_limit,
-            'tags': json.loads(self.tags) if self.tags else [],
-            'learning_objectives': json.loads(self.learning_objectives) if self.learning_objectives else [],
-            'created_by': self.created_by,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'is_active': self.is_active,
-            'times_used': self.times_used,
-            'correct_responses': self.correct_responses,
-            'average_response_time': self.average_response_time
-        }
+        """Return the question as a QuestionData record (orjson serializes dataclasses natively)"""
+        return QuestionData(
+            id=self.id,
+            topic_id=self.topic_id,
+            course_id=self.course_id,
+            question_text=self.question_text,
+            question_type=self.question_type,
+            difficulty_level=self.difficulty_level,
+            points=self.points,
+            options=self.options or [],
+            correct_answer=self.correct_answer,
+            explanation=self.explanation,
+            initial_difficulty=self.initial_difficulty,
+            discrimination=self.discrimination,
+            guessing=self.guessing,
+            time_limit=self.time_limit,
+            tags=self.tags or [],
+            learning_objectives=self.learning_objectives or [],
+            created_by=self.created_by,
+            created_at=self.created_at,
+            is_active=self.is_active,
+            times_used=self.times_used,
+            correct_responses=self.correct_responses,
+            average_response_time=self.average_response_time
+        )
+    
+    @staticmethod
+    def json_array_contains(column, value):
+        """Filter expression matching rows whose JSON array column contains value"""
+        if db.engine.dialect.name == 'postgresql':
+            # Containment is what the jsonb_path_ops GIN indexes can serve
+            return column.op('@>')(cast([value], JSONB))
+        # The value comes from the request, so LIKE wildcards in it are escaped
+        pattern = json.dumps(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return cast(column, db.Text).like(f'%{pattern}%', escape='\\')
     
     def get_difficulty_score(self):
         """Get current difficulty score based on performance"""
+        if self._difficulty_cache is None:
+            self._difficulty_cache = self._compute_difficulty_score()
+        return self._difficulty_cache
+    
+    def _compute_difficulty_score(self):
         if self.times_used == 0:
             return self.initial_difficulty
         
@@ -101,22 +220,16 @@ class AdaptiveQuestion(db.Model):
             return max(0.0, self.initial_difficulty - 0.1)
         else:
             return self.initial_difficulty
-    
-    def update_statistics(self, is_correct, response_time):
-        """Update question statistics after use"""
-        self.times_used += 1
-        if is_correct:
-            self.correct_responses += 1
-        
-        # Update average response time
-        if self.average_response_time == 0:
-            self.average_response_time = response_time
-        else:
-            self.average_response_time = (self.average_response_time + response_time) / 2
 
 class AdaptiveAssessment(db.Model):
     """Store adaptive assessment sessions"""
     __tablename__ = 'adaptive_assessments'
+    __table_args__ = (
+        # A user's assessments newest first (quick_stats, get_assessments),
+        # with and without a status filter
+        db.Index('ix_aa_user_started', 'user_id', 'started_at'),
+        db.Index('ix_aa_user_status_started', 'user_id', 'status', 'started_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -158,42 +271,44 @@ class AdaptiveAssessment(db.Model):
     user = db.relationship('User', backref='adaptive_assessments')
     course = db.relationship('Course', backref='adaptive_assessments')
     topic = db.relationship('Topic', backref='adaptive_assessments')
-    responses = db.relationship('AssessmentResponse', backref='assessment', lazy='dynamic', cascade='all, delete-orphan')
+    responses = db.relationship('AssessmentResponse', backref='assessment', lazy='selectin',
+                                order_by='AssessmentResponse.answered_at', cascade='all, delete-orphan')
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'course_id': self.course_id,
-            'topic_id': self.topic_id,
-            'title': self.title,
-            'description': self.description,
-            'assessment_type': self.assessment_type,
-            'max_questions': self.max_questions,
-            'time_limit_minutes': self.time_limit_minutes,
-            'initial_difficulty': self.initial_difficulty,
-            'difficulty_adjustment_rate': self.difficulty_adjustment_rate,
-            'confidence_threshold': self.confidence_threshold,
-            'current_question_index': self.current_question_index,
-            'current_difficulty': self.current_difficulty,
-            'questions_answered': self.questions_answered,
-            'correct_answers': self.correct_answers,
-            'started_at': self.started_at.isoformat() if self.started_at else None,
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'time_spent_minutes': self.time_spent_minutes,
-            'final_score': self.final_score,
-            'proficiency_level': self.proficiency_level,
-            'confidence_interval': self.confidence_interval,
-            'status': self.status
-        }
+        """Return the assessment as an AssessmentData record (orjson serializes dataclasses natively)"""
+        return AssessmentData(
+            id=self.id,
+            user_id=self.user_id,
+            course_id=self.course_id,
+            topic_id=self.topic_id,
+            title=self.title,
+            description=self.description,
+            assessment_type=self.assessment_type,
+            max_questions=self.max_questions,
+            time_limit_minutes=self.time_limit_minutes,
+            initial_difficulty=self.initial_difficulty,
+            difficulty_adjustment_rate=self.difficulty_adjustment_rate,
+            confidence_threshold=self.confidence_threshold,
+            current_question_index=self.current_question_index,
+            current_difficulty=self.current_difficulty,
+            questions_answered=self.questions_answered,
+            correct_answers=self.correct_answers,
+            started_at=self.started_at,
+            completed_at=self.completed_at,
+            time_spent_minutes=self.time_spent_minutes,
+            final_score=self.final_score,
+            proficiency_level=self.proficiency_level,
+            confidence_interval=self.confidence_interval,
+            status=self.status
+        )
     
     def get_progress_percentage(self):
         """Get assessment progress percentage"""
-        return (self.questions_answered / self.max_questions) * 100 if self.max_questions > 0 else 0
+        return 100 * self.questions_answered / self.max_questions if self.max_questions > 0 else 0
     
     def get_accuracy_rate(self):
         """Get current accuracy rate"""
-        return (self.correct_answers / self.questions_answered) * 100 if self.questions_answered > 0 else 0
+        return 100 * self.correct_answers / self.questions_answered if self.questions_answered > 0 else 0
     
     def adjust_difficulty(self, is_correct, response_time):
         """Adjust difficulty based on response"""
@@ -234,12 +349,16 @@ class AdaptiveAssessment(db.Model):
         
         # Calculate confidence interval (simplified)
         if self.questions_answered > 0:
-            standard_error = np.sqrt((self.final_score * (100 - self.final_score)) / self.questions_answered)
+            standard_error = math.sqrt((self.final_score * (100 - self.final_score)) / self.questions_answered)
             self.confidence_interval = min(standard_error, 10.0)  # Cap at 10%
 
 class AssessmentResponse(db.Model):
     """Store individual question responses"""
     __tablename__ = 'assessment_responses'
+    __table_args__ = (
+        # Serves the "already answered" subquery as an index-only scan
+        db.Index('ix_ar_assessment', 'assessment_id', 'question_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     assessment_id = db.Column(db.Integer, db.ForeignKey('adaptive_assessments.id'), nullable=False)
@@ -265,7 +384,7 @@ class AssessmentResponse(db.Model):
     explanation_shown = db.Column(db.Boolean, default=False)
     
     # Relationships
-    question = db.relationship('AdaptiveQuestion', backref='responses')
+    question = db.relationship('AdaptiveQuestion', backref=db.backref('responses', lazy='raise'))
     user = db.relationship('User', backref='assessment_responses')
     
     def to_dict(self):
@@ -277,8 +396,8 @@ class AssessmentResponse(db.Model):
             'user_answer': self.user_answer,
             'is_correct': self.is_correct,
             'points_earned': self.points_earned,
-            'question_started_at': self.question_started_at.isoformat() if self.question_started_at else None,
-            'answered_at': self.answered_at.isoformat() if self.answered_at else None,
+            'question_started_at': self.question_started_at,
+            'answered_at': self.answered_at,
             'response_time_seconds': self.response_time_seconds,
             'question_difficulty': self.question_difficulty,
             'user_ability_estimate': self.user_ability_estimate,
@@ -309,9 +428,9 @@ class AssessmentAnalytics(db.Model):
     
     # Difficulty progression
     current_proficiency_level = db.Column(db.String(20), default='beginner')
-    difficulty_progression = db.Column(db.Text, nullable=True)  # JSON array of difficulty levels
-    strength_areas = db.Column(db.Text, nullable=True)  # JSON array of strong topics
-    weak_areas = db.Column(db.Text, nullable=True)  # JSON array of weak topics
+    difficulty_progression = db.Column(JSONType, nullable=True)  # JSON array of difficulty levels
+    strength_areas = db.Column(JSONType, nullable=True)  # JSON array of strong topics
+    weak_areas = db.Column(JSONType, nullable=True)  # JSON array of weak topics
     
     # Engagement metrics
     last_assessment_date = db.Column(db.DateTime, nullable=True)
@@ -321,6 +440,13 @@ class AssessmentAnalytics(db.Model):
     # Last updated
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # One row per user/course/topic; COALESCE so rows without a course or
+    # topic also conflict (NULLs are distinct in a plain unique index)
+    __table_args__ = (
+        db.Index('uq_assessment_analytics_scope', user_id,
+                 func.coalesce(course_id, 0), func.coalesce(topic_id, 0), unique=True),
+    )
+    
     # Relationships
     user = db.relationship('User', backref='assessment_analytics')
     course = db.relationship('Course', backref='assessment_analytics')
@@ -341,65 +467,249 @@ class AssessmentAnalytics(db.Model):
             'total_time_spent_minutes': self.total_time_spent_minutes,
             'average_time_per_question': self.average_time_per_question,
             'current_proficiency_level': self.current_proficiency_level,
-            'difficulty_progression': json.loads(self.difficulty_progression) if self.difficulty_progression else [],
-            'strength_areas': json.loads(self.strength_areas) if self.strength_areas else [],
-            'weak_areas': json.loads(self.weak_areas) if self.weak_areas else [],
-            'last_assessment_date': self.last_assessment_date.isoformat() if self.last_assessment_date else None,
+            'difficulty_progression': self.difficulty_progression or [],
+            'strength_areas': self.strength_areas or [],
+            'weak_areas': self.weak_areas or [],
+            'last_assessment_date': self.last_assessment_date,
             'assessment_frequency': self.assessment_frequency,
             'improvement_rate': self.improvement_rate,
-            'last_updated': self.last_updated.isoformat() if self.last_updated else None
+            'last_updated': self.last_updated
         }
     
+    @classmethod
+    def get_or_create(cls, user_id, course_id=None, topic_id=None):
+        """Return the analytics row for a user/course/topic, inserting it if missing"""
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            # INSERT ... ON CONFLICT DO NOTHING is race free, unlike SELECT-then-INSERT
+            insert = postgresql_insert if dialect == 'postgresql' else sqlite_insert
+            try:
+                # In a savepoint, so a failure leaves the outer transaction usable
+                with db.session.begin_nested():
+                    db.session.execute(insert(cls).values(
+                        user_id=user_id, course_id=course_id, topic_id=topic_id
+                    ).on_conflict_do_nothing(index_elements=[
+                        # Literal zeros so the conflict target matches the index expression
+                        cls.user_id,
+                        func.coalesce(cls.course_id, literal_column('0')),
+                        func.coalesce(cls.topic_id, literal_column('0'))
+                    ]))
+            except (OperationalError, ProgrammingError):
+                # A database that migrate_database.py has not upgraded yet lacks
+                # uq_assessment_analytics_scope; fall back to SELECT-then-INSERT
+                pass
+        
+        # Oldest first, in case an unmigrated database holds duplicates
+        analytics = cls.query.filter_by(
+            user_id=user_id, course_id=course_id, topic_id=topic_id
+        ).order_by(cls.id).first()
+        if analytics is None:
+            analytics = cls(user_id=user_id, course_id=course_id, topic_id=topic_id)
+            db.session.add(analytics)
+            db.session.flush()
+        return analytics
+    
+    def record_assessment(self, assessment):
+        """Fold a finished or abandoned assessment into these analytics"""
+        self.total_assessments += 1
+        if assessment.status == 'completed':
+            self.completed_assessments += 1
+            self.last_assessment_date = datetime.utcnow()
+        
+        # Update scores
+        if assessment.final_score:
+            if self.average_score == 0:
+                self.average_score = assessment.final_score
+            else:
+                total_score = self.average_score * (self.completed_assessments - 1) + assessment.final_score
+                self.average_score = total_score / self.completed_assessments
+            
+            if assessment.final_score > self.best_score:
+                self.best_score = assessment.final_score
+        
+        # Update question and time statistics with SQL aggregates
+        self.recompute()
+        
+        self.total_time_spent_minutes += assessment.time_spent_minutes
+        
+        if assessment.proficiency_level:
+            self.current_proficiency_level = assessment.proficiency_level
+        
+        # Keep the last 10 difficulties. PostgreSQL appends and trims the
+        # jsonb array in the UPDATE itself, without reading it back first.
+        if db.session.get_bind().dialect.name == 'postgresql':
+            progression = func.coalesce(AssessmentAnalytics.difficulty_progression, cast([], JSONB))
+            self.difficulty_progression = func.jsonb_path_query_array(
+                progression.op('||')(func.to_jsonb(cast(assessment.current_difficulty, db.Float))),
+                '$[last - 9 to last]'
+            )
+        else:
+            difficulty_progression = list(self.difficulty_progression or [])
+            difficulty_progression.append(assessment.current_difficulty)
+            self.difficulty_progression = difficulty_progression[-10:]
+        
+        self.last_updated = datetime.utcnow()
+    
+    def recompute(self):
+        """Recompute response totals for this user/course/topic with SQL aggregates"""
+        query = db.session.query(
+            func.count(AssessmentResponse.id),
+            func.sum(case((AssessmentResponse.is_correct, 1), else_=0)),
+            func.avg(AssessmentResponse.response_time_seconds)
+        ).filter(AssessmentResponse.user_id == self.user_id)
+        
+        if self.course_id is not None or self.topic_id is not None:
+            query = query.join(AdaptiveAssessment, AssessmentResponse.assessment_id == AdaptiveAssessment.id)
+            if self.course_id is not None:
+                query = query.filter(AdaptiveAssessment.course_id == self.course_id)
+            if self.topic_id is not None:
+                query = query.filter(AdaptiveAssessment.topic_id == self.topic_id)
+        
+        total_questions, total_correct, average_time = query.one()
+        self.total_questions_answered = total_questions
+        self.total_correct_answers = total_correct or 0
+        self.average_time_per_question = average_time or 0.0
+    
     def get_accuracy_rate(self):
         """Get overall accuracy rate"""
-        return (self.total_correct_answers / self.total_questions_answered) * 100 if self.total_questions_answered > 0 else 0
+        return 100 * self.total_correct_answers / self.total_questions_answered if self.total_questions_answered > 0 else 0
     
     def get_completion_rate(self):
         """Get assessment completion rate"""
-        return (self.completed_assessments / self.total_assessments) * 100 if self.total_assessments > 0 else 0
+        return 100 * self.completed_assessments / self.total_assessments if self.total_assessments > 0 else 0
 
 class AdaptiveAssessmentEngine:
     """Engine for managing adaptive assessments"""
     
     def __init__(self):
         self.ability_estimation_method = 'irt'  # irt, bayesian, simple
+        # Random generator for question selection noise
+        self.rng = np.random.default_rng()
     
-    def select_next_question(self, assessment, user_responses):
+    def select_next_question(self, assessment):
         """Select the next question based on current performance"""
         if assessment.questions_answered >= assessment.max_questions:
             return None
         
-        # Get available questions for the topic/course
-        available_questions = AdaptiveQuestion.query.filter_by(
-            topic_id=assessment.topic_id,
-            course_id=assessment.course_id,
-            is_active=True
-        ).all()
+        # PostgreSQL can score and pick the winner itself in one round trip,
+        # unless the assessment's pool was already loaded by preload_questions
+        pool = self._cached_question_pool(assessment.course_id, assessment.topic_id)
+        if pool is None and db.session.get_bind().dialect.name == 'postgresql':
+            return self._select_next_question_sql(assessment)
+        if pool is None:
+            pool = self._question_pool(assessment.course_id, assessment.topic_id)
+        
+        # Already answered questions come from the loaded responses, no query needed
+        answered_ids = [r.question_id for r in assessment.responses]
+        if answered_ids:
+            pool = pool[~np.isin(pool[:, 0], answered_ids)]
         
-        if not available_questions:
+        if not len(pool):
             return None
         
-        # Filter out already answered questions
-        answered_question_ids = [r.question_id for r in user_responses]
-        available_questions = [q for q in available_questions if q.id not in answered_question_ids]
+        question_ids, initial_difficulty, times_used, correct_responses = pool.T
         
-        if not available_questions:
-            return None
+        # Same adjustment as AdaptiveQuestion.get_difficulty_score, for all candidates at once
+        success_rate = np.divide(correct_responses, times_used,
+                                 out=np.zeros_like(times_used), where=times_used > 0)
+        difficulty = np.where(
+            times_used == 0, initial_difficulty,
+            np.where(success_rate > 0.8, np.minimum(1.0, initial_difficulty + 0.1),
+                     np.where(success_rate < 0.3, np.maximum(0.0, initial_difficulty - 0.1),
+                              initial_difficulty))
+        )
+        
+        # Prefer questions close to the target difficulty, but add some randomness
+        noise = self.rng.standard_normal(len(question_ids)) * 0.1
+        best = self._score_questions(difficulty, assessment.current_difficulty, noise)
+        
+        return db.session.get(AdaptiveQuestion, int(question_ids[best]))
+    
+    def preload_questions(self, assessment):
+        """Load the candidate pool of an assessment that is being started so
+        every following question is selected without scanning the bank"""
+        self._question_pool(assessment.course_id, assessment.topic_id)
+    
+    @staticmethod
+    def _cached_question_pool(course_id, topic_id):
+        """Return the cached pool of a course/topic, or None if missing or expired"""
+        cached = _question_pools.get((course_id, topic_id))
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        return None
+    
+    def _question_pool(self, course_id, topic_id):
+        """Return the active questions of a course/topic as rows of
+        (id, initial_difficulty, times_used, correct_responses)"""
+        cached = self._cached_question_pool(course_id, topic_id)
+        if cached is not None:
+            return cached
         
-        # Select question based on current difficulty
-        target_difficulty = assessment.current_difficulty
+        # lambda_stmt caches the constructed/compiled SQL across calls; the
+        # closure values (ids) are extracted as bound parameters each time.
+        # Only the columns needed for scoring are fetched for the candidates.
+        stmt = lambda_stmt(lambda: select(
+            AdaptiveQuestion.id,
+            AdaptiveQuestion.initial_difficulty,
+            AdaptiveQuestion.times_used,
+            AdaptiveQuestion.correct_responses
+        ).where(
+            AdaptiveQuestion.course_id == course_id,
+            AdaptiveQuestion.is_active == True
+        ))
+        if topic_id is None:
+            stmt += lambda s: s.where(AdaptiveQuestion.topic_id.is_(None))
+        else:
+            stmt += lambda s: s.where(AdaptiveQuestion.topic_id == topic_id)
+        
+        # Stream the candidate rows in batches straight into a float array so
+        # large catalogs never hold every row tuple in memory at once
+        result = db.session.execute(stmt, execution_options={'yield_per': 500})
+        chunks = [np.array(partition, dtype=np.float64) for partition in result.partitions()]
+        pool = np.concatenate(chunks) if chunks else np.empty((0, 4))
         
-        # Find questions close to target difficulty
-        question_scores = []
-        for question in available_questions:
-            difficulty_diff = abs(question.get_difficulty_score() - target_difficulty)
-            # Prefer questions with similar difficulty, but add some randomness
-            score = 1.0 / (1.0 + difficulty_diff) + np.random.normal(0, 0.1)
-            question_scores.append((question, score))
+        _question_pools[(course_id, topic_id)] = (time.monotonic() + QUESTION_POOL_TTL, pool)
+        return pool
+    
+    def _select_next_question_sql(self, assessment):
+        """Select the next question with the scoring done in an ORDER BY ... LIMIT 1"""
+        initial = AdaptiveQuestion.initial_difficulty
+        times_used = AdaptiveQuestion.times_used
+        success_rate = cast(AdaptiveQuestion.correct_responses, db.Float) / func.nullif(cast(times_used, db.Float), 0)
+        difficulty = case(
+            (times_used == 0, initial),
+            (success_rate > 0.8, func.least(1.0, initial + 0.1)),
+            (success_rate < 0.3, func.greatest(0.0, initial - 0.1)),
+            else_=initial
+        )
+        score = 1.0 / (1.0 + func.abs(difficulty - assessment.current_difficulty)) + (func.random() * 0.2 - 0.1)
         
-        # Sort by score and select top question
-        question_scores.sort(key=lambda x: x[1], reverse=True)
-        return question_scores[0][0] if question_scores else available_questions[0]
+        if assessment.topic_id is None:
+            topic_filter = AdaptiveQuestion.topic_id.is_(None)
+        else:
+            topic_filter = AdaptiveQuestion.topic_id == assessment.topic_id
+        
+        stmt = select(AdaptiveQuestion).where(
+            AdaptiveQuestion.course_id == assessment.course_id,
+            AdaptiveQuestion.is_active == True,
+            topic_filter,
+            ~AdaptiveQuestion.id.in_(
+                select(AssessmentResponse.question_id).where(AssessmentResponse.assessment_id == assessment.id)
+            )
+        ).order_by(score.desc()).limit(1)
+        
+        return db.session.scalars(stmt).first()
+    
+    @staticmethod
+    def _score_questions(difficulties, target, noise):
+        """Return the index of the best scoring question: 1 / (1 + |d - target|) + noise"""
+        # Computed in place on a single buffer to avoid per-step temporaries
+        scores = np.subtract(difficulties, target)
+        np.abs(scores, out=scores)
+        scores += 1.0
+        np.reciprocal(scores, out=scores)
+        scores += noise
+        return int(scores.argmax())
     
     def estimate_user_ability(self, user_responses):
         """Estimate user ability using IRT or other methods"""
@@ -461,5 +771,29 @@ class AdaptiveAssessmentEngine:
         
         return feedback
 
-# Global assessment engine instance
-assessment_engine = AdaptiveAssessmentEngine() 
\ No newline at end of file
+# Candidate pools per (course_id, topic_id) for the NumPy selection path,
+# kept for QUESTION_POOL_TTL seconds so an assessment loads its pool once.
+# Question statistics in a cached pool may lag by up to the TTL.
+_question_pools = {}
+QUESTION_POOL_TTL = 300
+
+@event.listens_for(AdaptiveQuestion, 'after_insert')
+@event.listens_for(AdaptiveQuestion, 'after_delete')
+def _invalidate_question_pool(mapper, connection, target):
+    _question_pools.pop((target.course_id, target.topic_id), None)
+
+@event.listens_for(AdaptiveQuestion, 'after_update')
+def _invalidate_question_pool_on_update(mapper, connection, target):
+    # Statistics updates after every answer leave the pools alone; edits that
+    # move a question or change its membership are rare, so drop everything
+    state = db.inspect(target)
+    if any(state.attrs[attr].history.has_changes()
+           for attr in ('course_id', 'topic_id', 'is_active', 'initial_difficulty')):
+        _question_pools.clear()
+
+def get_engine():
+    """Return the assessment engine of the current app, creating it on first use"""
+    engine = current_app.extensions.get('assessment_engine')
+    if engine is None:
+        engine = current_app.extensions['assessment_engine'] = AdaptiveAssessmentEngine()
+    return engine
@@ -1,16 +1,22 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, url_for
 from flask_login import login_required, current_user
 from adaptive_assessment_models import (
     AdaptiveQuestion, AdaptiveAssessment, AssessmentResponse, 
-    AssessmentAnalytics, assessment_engine
+    AssessmentAnalytics, QuestionType, DifficultyLevel, get_engine
 )
 from models import db
-import json
-from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+from caching import cache, user_cache_key
+import tasks
+from datetime import timedelta
+from sqlalchemy import case, func, desc, select, true
+from sqlalchemy.orm import lazyload
 
 adaptive_bp = Blueprint('adaptive', __name__)
 
+def invalidate_quick_stats():
+    """Drop the current user's cached quick stats after their assessments change"""
+    cache.delete(user_cache_key(url_for('adaptive.quick_stats')))
+
 @adaptive_bp.route('/questions', methods=['GET'])
 @login_required
 def get_questions():
@@ -19,7 +25,10 @@ def get_questions():
     course_id = request.args.get('course_id', type=int)
     difficulty = request.args.get('difficulty')
     question_type = request.args.get('question_type')
+    tag = request.args.get('tag')
+    learning_objective = request.args.get('learning_objective')
     limit = request.args.get('limit', 10, type=int)
+    page = request.args.get('page', 1, type=int)
     
     query = AdaptiveQuestion.query.filter_by(is_active=True)
     
@@ -31,12 +40,19 @@ def get_questions():
         query = query.filter_by(difficulty_level=difficulty)
     if question_type:
         query = query.filter_by(question_type=question_type)
+    if tag:
+        query = query.filter(AdaptiveQuestion.json_array_contains(AdaptiveQuestion.tags, tag))
+    if learning_objective:
+        query = query.filter(AdaptiveQuestion.json_array_contains(
+            AdaptiveQuestion.learning_objectives, learning_objective
+        ))
     
-    questions = query.limit(limit).all()
+    questions = query.order_by(AdaptiveQuestion.id).limit(limit).offset((max(page, 1) - 1) * limit).all()
     
     return jsonify({
         'success': True,
-        'questions': [q.to_dict() for q in questions]
+        'questions': [q.to_dict() for q in questions],
+        'page': page
     })
 
 @adaptive_bp.route('/questions', methods=['POST'])
@@ -51,6 +67,17 @@ def create_question():
     
     data = request.get_json()
     
+    if data['question_type'] not in [t.value for t in QuestionType]:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid question type'
+        }), 400
+    if data['difficulty_level'] not in [d.value for d in DifficultyLevel]:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid difficulty level'
+        }), 400
+    
     question = AdaptiveQuestion(
         topic_id=data['topic_id'],
         course_id=data['course_id'],
@@ -58,15 +85,15 @@ def create_question():
         question_type=data['question_type'],
         difficulty_level=data['difficulty_level'],
         points=data.get('points', 1),
-        options=json.dumps(data.get('options', [])),
+        options=data.get('options', []),
         correct_answer=data['correct_answer'],
         explanation=data.get('explanation'),
         initial_difficulty=data.get('initial_difficulty', 0.5),
         discrimination=data.get('discrimination', 1.0),
         guessing=data.get('guessing', 0.25),
         time_limit=data.get('time_limit', 60),
-        tags=json.dumps(data.get('tags', [])),
-        learning_objectives=json.dumps(data.get('learning_objectives', [])),
+        tags=data.get('tags', []),
+        learning_objectives=data.get('learning_objectives', []),
         created_by=current_user.id
     )
     
@@ -85,6 +112,8 @@ def get_assessments():
     """Get user's assessments"""
     status = request.args.get('status')
     course_id = request.args.get('course_id', type=int)
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
     
     query = AdaptiveAssessment.query.filter_by(user_id=current_user.id)
     
@@ -93,11 +122,19 @@ def get_assessments():
     if course_id:
         query = query.filter_by(course_id=course_id)
     
-    assessments = query.order_by(desc(AdaptiveAssessment.started_at)).all()
+    assessments = query.order_by(desc(AdaptiveAssessment.started_at)).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
     
     return jsonify({
         'success': True,
-        'assessments': [a.to_dict() for a in assessments]
+        'assessments': [a.to_dict() for a in assessments.items],
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': assessments.total,
+            'pages': assessments.pages
+        }
     })
 
 @adaptive_bp.route('/assessments', methods=['POST'])
@@ -122,6 +159,7 @@ def create_assessment():
     
     db.session.add(assessment)
     db.session.commit()
+    invalidate_quick_stats()
     
     return jsonify({
         'success': True,
@@ -150,8 +188,10 @@ def start_assessment(assessment_id):
             'message': 'Assessment is not available'
         }), 400
     
-    # Get first question
-    first_question = assessment_engine.select_next_question(assessment, [])
+    # Load the candidate pool once; later questions are picked from it
+    engine = get_engine()
+    engine.preload_questions(assessment)
+    first_question = engine.select_next_question(assessment)
     
     if not first_question:
         return jsonify({
@@ -186,18 +226,14 @@ def get_current_question(assessment_id):
             'message': 'Assessment is not in progress'
         }), 400
     
-    # Get user responses
-    user_responses = AssessmentResponse.query.filter_by(
-        assessment_id=assessment_id
-    ).all()
-    
     # Select next question
-    next_question = assessment_engine.select_next_question(assessment, user_responses)
+    next_question = get_engine().select_next_question(assessment)
     
     if not next_question:
         # Assessment is complete
         assessment.complete_assessment()
         db.session.commit()
+        invalidate_quick_stats()
         
         return jsonify({
             'success': True,
@@ -216,10 +252,13 @@ def get_current_question(assessment_id):
 @login_required
 def submit_answer(assessment_id):
     """Submit an answer for the current question"""
+    # Lock the row for this transaction: the counters and difficulty below are
+    # computed from the loaded values, so a concurrent answer must wait for
+    # this one's single commit instead of overwriting it
     assessment = AdaptiveAssessment.query.filter_by(
         id=assessment_id,
         user_id=current_user.id
-    ).first()
+    ).with_for_update().first()
     
     if not assessment:
         return jsonify({
@@ -239,7 +278,7 @@ def submit_answer(assessment_id):
     response_time = data.get('response_time', 0)
     
     # Get the question
-    question = AdaptiveQuestion.query.get(question_id)
+    question = db.session.get(AdaptiveQuestion, question_id)
     if not question:
         return jsonify({
             'success': False,
@@ -247,25 +286,24 @@ def submit_answer(assessment_id):
         }), 404
     
     # Check if answer is correct
-    is_correct = user_answer.strip().lower() == question.correct_answer.strip().lower()
+    is_correct = question.is_correct_answer(user_answer)
     points_earned = question.points if is_correct else 0
     
     # Create response
     response = AssessmentResponse(
-        assessment_id=assessment_id,
-        question_id=question_id,
+        question=question,
         user_id=current_user.id,
         user_answer=user_answer,
         is_correct=is_correct,
         points_earned=points_earned,
         response_time_seconds=response_time,
         question_difficulty=question.get_difficulty_score(),
-        user_ability_estimate=assessment_engine.estimate_user_ability(
-            AssessmentResponse.query.filter_by(assessment_id=assessment_id).all()
-        )
+        user_ability_estimate=get_engine().estimate_user_ability(assessment.responses)
     )
     
-    db.session.add(response)
+    # Appending keeps the loaded responses current, so termination can be
+    # decided before the single commit below
+    assessment.responses.append(response)
     
     # Update assessment progress
     assessment.questions_answered += 1
@@ -275,37 +313,40 @@ def submit_answer(assessment_id):
     # Adjust difficulty
     assessment.adjust_difficulty(is_correct, response_time)
     
-    # Update question statistics
-    question.update_statistics(is_correct, response_time)
-    
-    db.session.commit()
-    
     # Generate feedback
-    feedback = assessment_engine.generate_feedback(response)
+    feedback = get_engine().generate_feedback(response)
     
     # Check if assessment should terminate early
-    should_terminate = assessment_engine.should_terminate_assessment(
+    should_terminate = get_engine().should_terminate_assessment(
         assessment, 
-        AssessmentResponse.query.filter_by(assessment_id=assessment_id).all()
+        assessment.responses
     )
     
+    # The payload is built before committing; reading the assessment after
+    # the commit would reload it and its responses from the database
     if should_terminate or assessment.questions_answered >= assessment.max_questions:
         assessment.complete_assessment()
-        db.session.commit()
-        
-        return jsonify({
+        payload = {
             'success': True,
             'assessment_complete': True,
             'assessment': assessment.to_dict(),
             'feedback': feedback
-        })
+        }
+    else:
+        payload = {
+            'success': True,
+            'feedback': feedback,
+            'progress': assessment.get_progress_percentage(),
+            'current_difficulty': assessment.current_difficulty
+        }
     
-    return jsonify({
-        'success': True,
-        'feedback': feedback,
-        'progress': assessment.get_progress_percentage(),
-        'current_difficulty': assessment.current_difficulty
-    })
+    db.session.commit()
+    invalidate_quick_stats()
+    
+    # Question statistics only feed later selections, so update them off the request path
+    tasks.submit(tasks.update_question_statistics, question.id, is_correct, response_time)
+    
+    return jsonify(payload)
 
 @adaptive_bp.route('/assessments/<int:assessment_id>/results', methods=['GET'])
 @login_required
@@ -329,37 +370,34 @@ def get_assessment_results(assessment_id):
         }), 400
     
     # Get all responses
-    responses = AssessmentResponse.query.filter_by(assessment_id=assessment_id).all()
+    responses = assessment.responses
     
-    # Calculate detailed statistics
+    # Calculate detailed statistics, counted by the database per
+    # (question type, difficulty, time range) group
     question_types = {}
     difficulty_breakdown = {}
     time_analysis = {}
     
-    for response in responses:
-        # Question type analysis
-        q_type = response.question.question_type
-        if q_type not in question_types:
-            question_types[q_type] = {'total': 0, 'correct': 0}
-        question_types[q_type]['total'] += 1
-        if response.is_correct:
-            question_types[q_type]['correct'] += 1
-        
-        # Difficulty analysis
-        diff_level = response.question.difficulty_level
-        if diff_level not in difficulty_breakdown:
-            difficulty_breakdown[diff_level] = {'total': 0, 'correct': 0}
-        difficulty_breakdown[diff_level]['total'] += 1
-        if response.is_correct:
-            difficulty_breakdown[diff_level]['correct'] += 1
-        
-        # Time analysis
-        time_range = 'fast' if response.response_time_seconds < 30 else 'medium' if response.response_time_seconds < 60 else 'slow'
-        if time_range not in time_analysis:
-            time_analysis[time_range] = {'total': 0, 'correct': 0}
-        time_analysis[time_range]['total'] += 1
-        if response.is_correct:
-            time_analysis[time_range]['correct'] += 1
+    time_range = case(
+        (AssessmentResponse.response_time_seconds < 30, 'fast'),
+        (AssessmentResponse.response_time_seconds < 60, 'medium'),
+        else_='slow'
+    )
+    groups = db.session.query(
+        AdaptiveQuestion.question_type,
+        AdaptiveQuestion.difficulty_level,
+        time_range,
+        func.count(),
+        func.sum(case((AssessmentResponse.is_correct == True, 1), else_=0))
+    ).join(AssessmentResponse.question).filter(
+        AssessmentResponse.assessment_id == assessment.id
+    ).group_by(AdaptiveQuestion.question_type, AdaptiveQuestion.difficulty_level, time_range)
+    
+    for q_type, diff_level, time_key, total, correct in groups:
+        for breakdown, key in ((question_types, q_type), (difficulty_breakdown, diff_level), (time_analysis, time_key)):
+            bucket = breakdown.setdefault(key, {'total': 0, 'correct': 0})
+            bucket['total'] += total
+            bucket['correct'] += correct
     
     return jsonify({
         'success': True,
@@ -393,12 +431,7 @@ def get_user_analytics():
     
     if not analytics:
         # Create analytics record if it doesn't exist
-        analytics = AssessmentAnalytics(
-            user_id=current_user.id,
-            course_id=course_id,
-            topic_id=topic_id
-        )
-        db.session.add(analytics)
+        analytics = AssessmentAnalytics.get_or_create(current_user.id, course_id, topic_id)
         db.session.commit()
     
     return jsonify({
@@ -413,78 +446,25 @@ def update_analytics():
     data = request.get_json()
     assessment_id = data['assessment_id']
     
-    assessment = AdaptiveAssessment.query.get(assessment_id)
+    # Only the owner is needed here; the job aggregates the responses in SQL
+    assessment = db.session.get(AdaptiveAssessment, assessment_id,
+                                options=[lazyload(AdaptiveAssessment.responses)])
     if not assessment or assessment.user_id != current_user.id:
         return jsonify({
             'success': False,
             'message': 'Assessment not found'
         }), 404
     
-    # Get or create analytics record
-    analytics = AssessmentAnalytics.query.filter_by(
-        user_id=current_user.id,
-        course_id=assessment.course_id,
-        topic_id=assessment.topic_id
-    ).first()
-    
-    if not analytics:
-        analytics = AssessmentAnalytics(
-            user_id=current_user.id,
-            course_id=assessment.course_id,
-            topic_id=assessment.topic_id
-        )
-        db.session.add(analytics)
-    
-    # Update analytics
-    analytics.total_assessments += 1
-    if assessment.status == 'completed':
-        analytics.completed_assessments += 1
-        analytics.last_assessment_date = datetime.utcnow()
-    
-    # Update scores
-    if assessment.final_score:
-        if analytics.average_score == 0:
-            analytics.average_score = assessment.final_score
-        else:
-            total_score = analytics.average_score * (analytics.completed_assessments - 1) + assessment.final_score
-            analytics.average_score = total_score / analytics.completed_assessments
-        
-        if assessment.final_score > analytics.best_score:
-            analytics.best_score = assessment.final_score
-    
-    # Update question statistics
-    responses = AssessmentResponse.query.filter_by(assessment_id=assessment_id).all()
-    analytics.total_questions_answered += len(responses)
-    analytics.total_correct_answers += sum(1 for r in responses if r.is_correct)
-    
-    # Update time statistics
-    total_time = sum(r.response_time_seconds for r in responses)
-    if analytics.average_time_per_question == 0:
-        analytics.average_time_per_question = total_time / len(responses) if responses else 0
-    else:
-        total_avg_time = analytics.average_time_per_question * (analytics.total_questions_answered - len(responses))
-        analytics.average_time_per_question = (total_avg_time + total_time) / analytics.total_questions_answered
-    
-    analytics.total_time_spent_minutes += assessment.time_spent_minutes
-    
-    # Update proficiency level
-    if assessment.proficiency_level:
-        analytics.current_proficiency_level = assessment.proficiency_level
-    
-    # Update difficulty progression
-    difficulty_progression = json.loads(analytics.difficulty_progression) if analytics.difficulty_progression else []
-    difficulty_progression.append(assessment.current_difficulty)
-    analytics.difficulty_progression = json.dumps(difficulty_progression[-10:])  # Keep last 10
-    
-    analytics.last_updated = datetime.utcnow()
-    
-    db.session.commit()
+    # Aggregating over every response does not need to hold up the request;
+    # the job also drops the cached quick stats once the row is updated
+    job_id = tasks.submit(tasks.update_user_analytics, assessment.id,
+                          user_cache_key(url_for('adaptive.quick_stats')))
     
     return jsonify({
         'success': True,
-        'message': 'Analytics updated successfully',
-        'analytics': analytics.to_dict()
-    })
+        'message': 'Analytics update queued',
+        'job_id': job_id
+    }), 202
 
 @adaptive_bp.route('/dashboard', methods=['GET'])
 @login_required
@@ -515,15 +495,35 @@ def admin_get_questions():
             'message': 'Admin access required'
         }), 403
     
-    questions = AdaptiveQuestion.query.all()
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    
+    # Only the listing columns, as plain rows rather than ORM instances
+    questions = db.session.query(
+        AdaptiveQuestion.id,
+        AdaptiveQuestion.topic_id,
+        AdaptiveQuestion.course_id,
+        AdaptiveQuestion.question_text,
+        AdaptiveQuestion.question_type,
+        AdaptiveQuestion.difficulty_level,
+        AdaptiveQuestion.is_active,
+        AdaptiveQuestion.times_used
+    ).order_by(AdaptiveQuestion.id).paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
         'success': True,
-        'questions': [q.to_dict() for q in questions]
+        'questions': [q._asdict() for q in questions.items],
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': questions.total,
+            'pages': questions.pages
+        }
     })
 
 @adaptive_bp.route('/admin/analytics', methods=['GET'])
 @login_required
+@cache.cached(key_prefix=user_cache_key)
 def admin_analytics():
     """Admin: Get system-wide analytics"""
     if not current_user.is_admin():
@@ -532,26 +532,27 @@ def admin_analytics():
             'message': 'Admin access required'
         }), 403
     
-    # Get system statistics
-    total_questions = AdaptiveQuestion.query.count()
-    total_assessments = AdaptiveAssessment.query.count()
-    completed_assessments = AdaptiveAssessment.query.filter_by(status='completed').count()
-    total_responses = AssessmentResponse.query.count()
-    
-    # Get average scores
-    avg_score = db.session.query(func.avg(AdaptiveAssessment.final_score)).scalar() or 0
-    
-    # Get question type distribution
-    question_types = db.session.query(
+    # Get system statistics and the average score in one round trip
+    total_questions, total_assessments, completed_assessments, total_responses, avg_score = db.session.query(
+        select(func.count()).select_from(AdaptiveQuestion).scalar_subquery(),
+        select(func.count()).select_from(AdaptiveAssessment).scalar_subquery(),
+        select(func.count()).select_from(AdaptiveAssessment)
+            .where(AdaptiveAssessment.status == 'completed').scalar_subquery(),
+        select(func.count()).select_from(AssessmentResponse).scalar_subquery(),
+        select(func.avg(AdaptiveAssessment.final_score)).scalar_subquery()
+    ).one()
+    avg_score = avg_score or 0
+    
+    # Get question type and difficulty distributions from one grouped query
+    question_types = {}
+    difficulty_dist = {}
+    for question_type, difficulty_level, count in db.session.query(
         AdaptiveQuestion.question_type,
-        func.count(AdaptiveQuestion.id)
-    ).group_by(AdaptiveQuestion.question_type).all()
-    
-    # Get difficulty distribution
-    difficulty_dist = db.session.query(
         AdaptiveQuestion.difficulty_level,
         func.count(AdaptiveQuestion.id)
-    ).group_by(AdaptiveQuestion.difficulty_level).all()
+    ).group_by(AdaptiveQuestion.question_type, AdaptiveQuestion.difficulty_level):
+        question_types[question_type] = question_types.get(question_type, 0) + count
+        difficulty_dist[difficulty_level] = difficulty_dist.get(difficulty_level, 0) + count
     
     return jsonify({
         'success': True,
@@ -563,36 +564,53 @@ def admin_analytics():
             'average_score': round(avg_score, 2),
             'completion_rate': round((completed_assessments / total_assessments * 100) if total_assessments > 0 else 0, 2)
         },
-        'question_types': dict(question_types),
-        'difficulty_distribution': dict(difficulty_dist)
+        'question_types': question_types,
+        'difficulty_distribution': difficulty_dist
     })
 
 # API endpoints for frontend integration
 @adaptive_bp.route('/api/quick-stats', methods=['GET'])
 @login_required
+@cache.cached(key_prefix=user_cache_key)
 def quick_stats():
     """Get quick statistics for dashboard"""
-    # Get recent assessments
-    recent_assessments = AdaptiveAssessment.query.filter_by(
-        user_id=current_user.id
-    ).order_by(desc(AdaptiveAssessment.started_at)).limit(5).all()
-    
-    # Get analytics
-    analytics = AssessmentAnalytics.query.filter_by(user_id=current_user.id).first()
+    # The user's analytics row is LEFT JOINed onto the recent assessments,
+    # so both come back in one round trip
+    analytics = select(
+        AssessmentAnalytics.current_proficiency_level,
+        AssessmentAnalytics.improvement_rate,
+        AssessmentAnalytics.total_assessments,
+        AssessmentAnalytics.average_score
+    ).where(AssessmentAnalytics.user_id == current_user.id).order_by(AssessmentAnalytics.id).limit(1).subquery()
+    
+    rows = db.session.execute(
+        select(AdaptiveAssessment, analytics)
+        .outerjoin(analytics, true())
+        .where(AdaptiveAssessment.user_id == current_user.id)
+        .order_by(desc(AdaptiveAssessment.started_at))
+        .limit(5)
+    ).all()
     
-    # Get current proficiency level
-    current_level = analytics.current_proficiency_level if analytics else 'beginner'
+    recent_assessments = [row[0] for row in rows]
     
-    # Get improvement trend
-    improvement_trend = 0
-    if analytics and analytics.improvement_rate:
-        improvement_trend = analytics.improvement_rate
+    # Analytics are only written for a user's assessments, so a user without
+    # any assessments has none either
+    if rows and rows[0].total_assessments is not None:
+        current_level = rows[0].current_proficiency_level
+        improvement_trend = rows[0].improvement_rate or 0
+        total_assessments = rows[0].total_assessments
+        average_score = rows[0].average_score
+    else:
+        current_level = 'beginner'
+        improvement_trend = 0
+        total_assessments = 0
+        average_score = 0
     
     return jsonify({
         'success': True,
         'recent_assessments': [a.to_dict() for a in recent_assessments],
         'current_proficiency': current_level,
         'improvement_trend': improvement_trend,
-        'total_assessments': analytics.total_assessments if analytics else 0,
-        'average_score': analytics.average_score if analytics else 0
+        'total_assessments': total_assessments,
+        'average_score': average_score
     }) 
\ No newline at end of file
@@ -1,9 +1,8 @@
 from flask import Blueprint, request, render_template, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required
-from models import db, User
-from werkzeug.security import generate_password_hash
-import csv
-import io
+import tasks
+import os
+import tempfile
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -24,52 +23,36 @@ def bulk_upload():
         
         if file and file.filename.endswith('.csv'):
             try:
-                # Read CSV file
-                stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                csv_input = csv.reader(stream)
-                
-                # Skip header row
-                next(csv_input, None)
-                
-                created_users = 0
-                for row in csv_input:
-                    if len(row) >= 3:  # username, email, role
-                        username = row[0].strip()
-                        email = row[1].strip().lower()
-                        role = row[2].strip().lower()
-                        
-                        # Optional fields
-                        first_name = row[3].strip() if len(row) > 3 else ''
-                        last_name = row[4].strip() if len(row) > 4 else ''
-                        
-                        # Validate role
-                        if role not in ['student', 'teacher', 'admin']:
-                            role = 'student'
-                        
-                        # Check if user already exists
-                        if User.query.filter_by(email=email).first():
-                            continue
-                            
-                        # Create user with default password
-                        user = User(
-                            username=username,
-                            email=email,
-                            role=role,
-                            first_name=first_name,
-                            last_name=last_name
-                        )
-                        user.set_password('Password123!')  # Default password, should be changed by user
-                        
-                        db.session.add(user)
-                        created_users += 1
-                
-                db.session.commit()
-                flash(f'Successfully created {created_users} users', 'success')
+                # Spool the upload to disk and parse it in the background, so
+                # the request returns as soon as the file is received
+                fd, path = tempfile.mkstemp(suffix='.csv')
+                os.close(fd)
+                file.save(path)
+                job_id = tasks.submit(tasks.bulk_create_users_from_csv, path)
+                return redirect(url_for('admin.bulk_upload_status', job_id=job_id), code=303)
                 
             except Exception as e:
-                db.session.rollback()
                 flash(f'Error processing file: {str(e)}', 'error')
         else:
             flash('Please upload a CSV file', 'error')
     
     return render_template('admin/bulk_upload.html')
+
+@admin_bp.route('/admin/bulk-upload/status/<job_id>', methods=['GET'])
+@login_required
+def bulk_upload_status(job_id):
+    """Report the progress of a bulk upload job"""
+    job = tasks.get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error']
+    })
@@ -1,141 +1,89 @@
 from flask import Blueprint, render_template, jsonify
 from flask_login import login_required, current_user
 from models import db, User
+from caching import cache, user_cache_key
 from content_models import Course, Enrollment, Assignment, AssignmentSubmission
 from progress_models import LearningSession
 from datetime import datetime, timedelta
+from sqlalchemy import select
 import json
 
 analytics_bp = Blueprint('analytics', __name__)
 
+def system_totals():
+    """Return the system-wide counts, fetched together in a single SELECT"""
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    
+    def count(model, *criteria):
+        return select(db.func.count()).select_from(model).filter(*criteria).scalar_subquery()
+    
+    row = db.session.query(
+        count(User).label('total_users'),
+        count(User, User.role == 'student').label('total_students'),
+        count(User, User.role == 'teacher').label('total_teachers'),
+        count(User, User.role == 'admin').label('total_admins'),
+        count(Course).label('total_courses'),
+        count(Enrollment).label('total_enrollments'),
+        count(Assignment).label('total_assignments'),
+        count(AssignmentSubmission).label('total_submissions'),
+        # Recent activity (last 30 days)
+        count(LearningSession, LearningSession.session_start >= thirty_days_ago).label('recent_sessions')
+    ).one()
+    return row._asdict()
+
+def daily_counts(column, days=7):
+    """Count rows per day of a datetime column over the last `days` days, newest first"""
+    today = datetime.utcnow().date()
+    start = datetime.combine(today - timedelta(days=days - 1), datetime.min.time())
+    
+    # One grouped query instead of a COUNT per day
+    day = db.func.date(column)
+    rows = db.session.query(day, db.func.count()).filter(column >= start).group_by(day).all()
+    counts = {str(d): count for d, count in rows}
+    
+    trend = []
+    for i in range(days):
+        date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
+        trend.append({
+            'date': date,
+            'count': counts.get(date, 0)
+        })
+    return trend
+
 @analytics_bp.route('/admin/analytics')
 @login_required
+@cache.cached(key_prefix=user_cache_key)
 def system_analytics():
     """Display system-wide analytics"""
     if not current_user.is_admin():
         return jsonify({'error': 'Unauthorized'}), 403
     
-    # Get user statistics
-    total_users = User.query.count()
-    total_students = User.query.filter_by(role='student').count()
-    total_teachers = User.query.filter_by(role='teacher').count()
-    total_admins = User.query.filter_by(role='admin').count()
-    
-    # Get course statistics
-    total_courses = Course.query.count()
-    total_enrollments = Enrollment.query.count()
-    
-    # Get assignment statistics
-    total_assignments = Assignment.query.count()
-    total_submissions = AssignmentSubmission.query.count()
-    
-    # Get recent activity (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_sessions = LearningSession.query.filter(
-        LearningSession.session_start >= thirty_days_ago
-    ).count()
+    # Get user, course, assignment and recent activity statistics
+    stats = system_totals()
     
     # User registration trend (last 7 days)
-    user_trend = []
-    for i in range(7):
-        date = datetime.utcnow() - timedelta(days=i)
-        count = User.query.filter(
-            db.func.date(User.created_at) == date.date()
-        ).count()
-        user_trend.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'count': count
-        })
+    stats['user_trend'] = daily_counts(User.created_at)
     
     # Course enrollment trend (last 7 days)
-    enrollment_trend = []
-    for i in range(7):
-        date = datetime.utcnow() - timedelta(days=i)
-        count = Enrollment.query.filter(
-            db.func.date(Enrollment.enrollment_date) == date.date()
-        ).count()
-        enrollment_trend.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'count': count
-        })
-    
-    stats = {
-        'total_users': total_users,
-        'total_students': total_students,
-        'total_teachers': total_teachers,
-        'total_admins': total_admins,
-        'total_courses': total_courses,
-        'total_enrollments': total_enrollments,
-        'total_assignments': total_assignments,
-        'total_submissions': total_submissions,
-        'recent_sessions': recent_sessions,
-        'user_trend': user_trend,
-        'enrollment_trend': enrollment_trend
-    }
+    stats['enrollment_trend'] = daily_counts(Enrollment.enrollment_date)
     
     return render_template('admin/analytics.html', user=current_user, stats=stats)
 
 @analytics_bp.route('/admin/analytics/data')
 @login_required
+@cache.cached(key_prefix=user_cache_key)
 def analytics_data():
     """API endpoint for analytics data"""
     if not current_user.is_admin():
         return jsonify({'error': 'Unauthorized'}), 403
     
-    # Get user statistics
-    total_users = User.query.count()
-    total_students = User.query.filter_by(role='student').count()
-    total_teachers = User.query.filter_by(role='teacher').count()
-    total_admins = User.query.filter_by(role='admin').count()
-    
-    # Get course statistics
-    total_courses = Course.query.count()
-    total_enrollments = Enrollment.query.count()
-    
-    # Get assignment statistics
-    total_assignments = Assignment.query.count()
-    total_submissions = AssignmentSubmission.query.count()
-    
-    # Get recent activity (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_sessions = LearningSession.query.filter(
-        LearningSession.session_start >= thirty_days_ago
-    ).count()
+    # Get user, course, assignment and recent activity statistics
+    stats = system_totals()
     
     # User registration trend (last 7 days)
-    user_trend = []
-    for i in range(7):
-        date = datetime.utcnow() - timedelta(days=i)
-        count = User.query.filter(
-            db.func.date(User.created_at) == date.date()
-        ).count()
-        user_trend.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'count': count
-        })
+    stats['user_trend'] = daily_counts(User.created_at)
     
     # Course enrollment trend (last 7 days)
-    enrollment_trend = []
-    for i in range(7):
-        date = datetime.utcnow() - timedelta(days=i)
-        count = Enrollment.query.filter(
-            db.func.date(Enrollment.enrollment_date) == date.date()
-        ).count()
-        enrollment_trend.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'count': count
-        })
+    stats['enrollment_trend'] = daily_counts(Enrollment.enrollment_date)
     
-    return jsonify({
-        'total_users': total_users,
-        'total_students': total_students,
-        'total_teachers': total_teachers,
-        'total_admins': total_admins,
-        'total_courses': total_courses,
-        'total_enrollments': total_enrollments,
-        'total_assignments': total_assignments,
-        'total_submissions': total_submissions,
-        'recent_sessions': recent_sessions,
-        'user_trend': user_trend,
-        'enrollment_trend': enrollment_trend
-    })
+    return jsonify(stats)
@@ -1,33 +1,26 @@
+import os
 from flask import Flask, render_template, redirect, url_for
+from jinja2 import FileSystemBytecodeCache
 from flask_login import LoginManager, login_required, current_user
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.orm import joinedload
 from config import Config
+from json_provider import OrjsonProvider
 from models import db, User
-from auth import auth_bp
-from content_routes import content_bp
-from progress_routes import progress_bp
-from recommendation_routes import recommendation_bp
-from adaptive_assessment_routes import adaptive_bp
-from auto_grading_routes import auto_grading_bp
-from gamification_routes import gamification_bp
-from chatbot_routes import chatbot_bp
-from admin_routes import admin_bp
-from analytics_routes import analytics_bp
-from moderation_routes import moderation_bp
+from caching import cache, user_cache_key
 
 def create_app():
     app = Flask(__name__, template_folder='templates')
     app.config.from_object(Config)
+    app.json = OrjsonProvider(app)
+    
+    cache_dir = app.config['TEMPLATE_BYTECODE_CACHE_DIR']
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
     
     # Initialize extensions
     db.init_app(app)
-    
-    # Configure Gemini API
-    import google.generativeai as genai
-    try:
-        genai.configure(api_key=app.config['GEMINI_API_KEY'])
-        print("Gemini API configured successfully")
-    except Exception as e:
-        print(f"Error configuring Gemini API: {e}")
+    cache.init_app(app)
     
     # Initialize Flask-Login
     login_manager = LoginManager()
@@ -36,53 +29,74 @@ def create_app():
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
     
+    # Flask-Login calls this at most once per request and keeps the result in
+    # g; db.session.get also returns a user already in the identity map
+    # without another SELECT
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return db.session.get(User, int(user_id))
     
-    # Register blueprints
+    # Register blueprints. They are imported here rather than at module level,
+    # so importing this module does not pull in every blueprint's models and
+    # dependencies before an app is actually created.
+    from auth import auth_bp, dashboard_url
     app.register_blueprint(auth_bp, url_prefix='/auth')
+    from content_routes import content_bp
     app.register_blueprint(content_bp, url_prefix='/content')
+    from progress_routes import progress_bp
     app.register_blueprint(progress_bp, url_prefix='/progress')
+    from recommendation_routes import recommendation_bp
     app.register_blueprint(recommendation_bp, url_prefix='/recommendation')
+    from adaptive_assessment_routes import adaptive_bp
     app.register_blueprint(adaptive_bp, url_prefix='/adaptive')
+    from auto_grading_routes import auto_grading_bp
     app.register_blueprint(auto_grading_bp, url_prefix='/auto_grading')
+    from gamification_routes import gamification_bp
     app.register_blueprint(gamification_bp, url_prefix='/gamification')
+    from chatbot_routes import chatbot_bp
     app.register_blueprint(chatbot_bp, url_prefix='/chatbot')
+    from admin_routes import admin_bp
     app.register_blueprint(admin_bp, url_prefix='/admin')
+    from analytics_routes import analytics_bp
     app.register_blueprint(analytics_bp, url_prefix='/admin')
+    from moderation_routes import moderation_bp
     app.register_blueprint(moderation_bp, url_prefix='/admin')
     
     # Main routes
     @app.route('/')
     def index():
         if current_user.is_authenticated:
-            if current_user.is_admin():
-                return redirect(url_for('admin_dashboard'))
-            elif current_user.is_teacher():
-                return redirect(url_for('teacher_dashboard'))
-            else:
-                return redirect(url_for('student_dashboard'))
+            return redirect(dashboard_url(current_user.role))
         return redirect(url_for('auth.login'))
     
     # Dashboard routes with real data
     @app.route('/student-dashboard')
     @login_required
+    @cache.cached(key_prefix=user_cache_key)
     def student_dashboard():
         if not current_user.is_student():
             return redirect(url_for('index'))
         
         # Import content models for data
-        from content_models import Enrollment, Course
+        from content_models import Enrollment, Course, Topic
         
-        # Get student statistics
-        enrolled_courses = Enrollment.query.filter_by(student_id=current_user.id, is_active=True).all()
+        # Get the enrollments with their course and the course's topic count
+        # in one query instead of two more per enrollment
+        topics_count = select(func.count(Topic.id)).where(
+            Topic.course_id == Enrollment.course_id
+        ).correlate(Enrollment).scalar_subquery()
+        rows = db.session.query(Enrollment, topics_count).options(
+            joinedload(Enrollment.course)
+        ).filter(
+            Enrollment.student_id == current_user.id,
+            Enrollment.is_active == True
+        ).all()
+        enrolled_courses = [enrollment for enrollment, _ in rows]
         total_courses = len(enrolled_courses)
         
         # Calculate progress for each enrollment
-        for enrollment in enrolled_courses:
+        for enrollment, topics_count in rows:
             if enrollment.course:
-                topics_count = enrollment.course.topics.count()
                 if topics_count > 0:
                     # Simple progress calculation (can be enhanced)
                     enrollment.progress_percentage = min(100, int((topics_count / 10) * 100))
@@ -105,18 +119,36 @@ def create_app():
     
     @app.route('/teacher-dashboard')
     @login_required
+    @cache.cached(key_prefix=user_cache_key)
     def teacher_dashboard():
         if not current_user.is_teacher():
             return redirect(url_for('index'))
         
         # Import content models for data
-        from content_models import Course, Enrollment
+        from content_models import Course, Enrollment, Topic
         
-        # Get teacher's courses
-        courses = Course.query.filter_by(instructor_id=current_user.id, is_active=True).all()
+        # Get teacher's courses with their enrollment and topic counts in one
+        # query instead of a COUNT per course
+        enrollments_count = select(func.count(Enrollment.id)).where(
+            Enrollment.course_id == Course.id
+        ).correlate(Course).scalar_subquery()
+        topics_count = select(func.count(Topic.id)).where(
+            Topic.course_id == Course.id
+        ).correlate(Course).scalar_subquery()
+        rows = db.session.query(Course, enrollments_count, topics_count).filter(
+            Course.instructor_id == current_user.id,
+            Course.is_active == True
+        ).all()
+        
+        courses = []
+        for course, course_enrollments, course_topics in rows:
+            # Shown on the course cards
+            course.enrollments_count = course_enrollments
+            course.topics_count = course_topics
+            courses.append(course)
         
         # Calculate statistics
-        total_students = sum(course.enrollments.count() for course in courses)
+        total_students = sum(course.enrollments_count for course in courses)
         total_courses = len(courses)
         
         stats = {
@@ -133,19 +165,26 @@ def create_app():
     
     @app.route('/admin-dashboard')
     @login_required
+    @cache.cached(key_prefix=user_cache_key)
     def admin_dashboard():
         if not current_user.is_admin():
             return redirect(url_for('index'))
         
-        # Get system statistics
-        total_users = User.query.count()
-        total_teachers = User.query.filter_by(role='teacher').count()
-        total_students = User.query.filter_by(role='student').count()
-        total_admins = User.query.filter_by(role='admin').count()
-        
         # Import content models for course data
         from content_models import Course
-        total_courses = Course.query.filter_by(is_active=True).count()
+        
+        # Get user counts per role and the active course count in one round trip
+        total_users, total_teachers, total_students, total_admins, total_courses = db.session.query(
+            func.count(User.id),
+            func.sum(case((User.role == 'teacher', 1), else_=0)),
+            func.sum(case((User.role == 'student', 1), else_=0)),
+            func.sum(case((User.role == 'admin', 1), else_=0)),
+            select(func.count(Course.id)).where(Course.is_active == True).scalar_subquery()
+        ).one()
+        # SUM over an empty table is NULL
+        total_teachers = total_teachers or 0
+        total_students = total_students or 0
+        total_admins = total_admins or 0
         
         # Calculate percentages
         total_active_users = total_teachers + total_students + total_admins
@@ -181,79 +220,85 @@ def create_app():
         """Real-time progress tracking page"""
         return render_template('progress/tracking.html', user=current_user)
     
-    # Create database tables
-    with app.app_context():
-        # Import content models to register them with the database
-        from content_models import Course, Topic, LearningMaterial, Video, Quiz, QuizQuestion, QuizOption, Assignment, Enrollment, QuizAttempt, QuizAnswer, AssignmentSubmission
-        
-        # Import progress tracking models to register them with the database
-        from progress_models import LearningSession, LearningActivity, CourseProgress, TopicProgress, LearningAnalytics, StudyStreak
-        
-        # Import recommendation models to register them with the database
-        from recommendation_models import UserPreference, LearningPattern, UserRecommendation, LearningCluster, ContentSimilarity
-        
-        # Import adaptive assessment models to register them with the database
-        from adaptive_assessment_models import AdaptiveQuestion, AdaptiveAssessment, AssessmentResponse, AssessmentAnalytics
-        
-        # Import auto-grading models to register them with the database
-        from auto_grading_models import AutoGradingModel, GradingCriteria, AutoGradingResult, HumanReview, GradingAnalytics
-        
-        # Import gamification models to register them with the database
-        from gamification_models import Badge, UserBadge, UserPoints, Leaderboard, LeaderboardEntry, Achievement, Notification
-        
-        # Import chatbot models to register them with the database
-        from chatbot_models import ChatMessage, FAQ, StudyReminder
-        
-        db.create_all()
-        
-        # Create default admin user if none exists
-        if not User.query.filter_by(role='admin').first():
-            admin = User(
-                username='admin',
-                email='admin@example.com',
-                role='admin',
-                first_name='System',
-                last_name='Administrator'
-            )
-            admin.set_password('Admin123!')
-            db.session.add(admin)
-            db.session.commit()
-            print("Default admin created: admin@example.com / Admin123!")
-        
-        # Create default FAQs
-        if not FAQ.query.first():
-            default_faqs = [
-                {
-                    "question": "How do I enroll in a course?",
-                    "answer": "You can browse available courses in the Course section and click 'Enroll' on any course you're interested in. You'll be automatically enrolled and can start learning immediately.",
-                    "category": "Courses"
-                },
-                {
-                    "question": "How do I track my progress?",
-                    "answer": "Visit the Progress section to see detailed analytics of your learning journey, including completion rates, grades, and time spent on different topics.",
-                    "category": "Progress"
-                },
-                {
-                    "question": "How do I get help with assignments?",
-                    "answer": "You can ask questions about assignments in the Chat Support section, or contact your instructor directly through the messaging system.",
-                    "category": "Assignments"
-                }
-            ]
-            
-            for faq_data in default_faqs:
-                faq = FAQ(
-                    question=faq_data["question"],
-                    answer=faq_data["answer"],
-                    category=faq_data["category"]
-                )
-                db.session.add(faq)
-            
-            db.session.commit()
-            print("Default FAQs created")
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the database tables and the default admin and FAQs"""
+        init_db()
     
     return app
 
-app = create_app()
+def init_db():
+    """Create missing tables and seed the default admin user and FAQs.
+
+    Run once per deployment with `flask --app app init-db` rather than on
+    every app start, so workers do not touch the database while booting.
+    """
+    # Import content models to register them with the database
+    from content_models import Course, Topic, LearningMaterial, Video, Quiz, QuizQuestion, QuizOption, Assignment, Enrollment, QuizAttempt, QuizAnswer, AssignmentSubmission
+    
+    # Import progress tracking models to register them with the database
+    from progress_models import LearningSession, LearningActivity, CourseProgress, TopicProgress, LearningAnalytics, StudyStreak
+    
+    # Import recommendation models to register them with the database
+    from recommendation_models import UserPreference, LearningPattern, UserRecommendation, LearningCluster, ContentSimilarity
+    
+    # Import adaptive assessment models to register them with the database
+    from adaptive_assessment_models import AdaptiveQuestion, AdaptiveAssessment, AssessmentResponse, AssessmentAnalytics
+    
+    # Import auto-grading models to register them with the database
+    from auto_grading_models import AutoGradingModel, GradingCriteria, AutoGradingResult, HumanReview, GradingAnalytics
+    
+    # Import gamification models to register them with the database
+    from gamification_models import Badge, UserBadge, UserPoints, Leaderboard, LeaderboardEntry, Achievement, Notification
+    
+    # Import chatbot models to register them with the database
+    from chatbot_models import ChatMessage, FAQ, StudyReminder
+    
+    db.create_all()
+    
+    # Create default admin user if none exists
+    if not User.query.filter_by(role='admin').first():
+        admin = User(
+            username='admin',
+            email='admin@example.com',
+            role='admin',
+            first_name='System',
+            last_name='Administrator'
+        )
+        admin.set_password('Admin123!')
+        db.session.add(admin)
+        db.session.commit()
+        print("Default admin created: admin@example.com / Admin123!")
+    
+    # Create default FAQs
+    if not FAQ.query.first():
+        default_faqs = [
+            {
+                "question": "How do I enroll in a course?",
+                "answer": "You can browse available courses in the Course section and click 'Enroll' on any course you're interested in. You'll be automatically enrolled and can start learning immediately.",
+                "category": "Courses"
+            },
+            {
+                "question": "How do I track my progress?",
+                "answer": "Visit the Progress section to see detailed analytics of your learning journey, including completion rates, grades, and time spent on different topics.",
+                "category": "Progress"
+            },
+            {
+                "question": "How do I get help with assignments?",
+                "answer": "You can ask questions about assignments in the Chat Support section, or contact your instructor directly through the messaging system.",
+                "category": "Assignments"
+            }
+        ]
+        
+        # One multi-row INSERT instead of adding each FAQ to the unit of work
+        db.session.execute(insert(FAQ), default_faqs)
+        db.session.commit()
+        print("Default FAQs created")
 
 if __name__ == '__main__':
+    # The WSGI server and the flask CLI call create_app() themselves; the
+    # development server also bootstraps the database
+    app = create_app()
+    with app.app_context():
+        init_db()
     app.run(debug=True)
@@ -1,36 +1,85 @@
-from flask import Blueprint, request, render_template, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, request, render_template, redirect, url_for, flash, jsonify, session, current_app
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import check_password_hash, generate_password_hash
 from models import db, User
 import re
+import secrets
+from functools import lru_cache
 
 auth_bp = Blueprint('auth', __name__)
 
+# Compiled once at import instead of looked up in re's cache on every call
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 def validate_email(email):
     """Simple email validation"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_password(password):
     """Password validation - at least 8 characters, 1 uppercase, 1 lowercase, 1 number"""
     if len(password) < 8:
         return False, "Password must be at least 8 characters long"
-    if not re.search(r'[A-Z]', password):
+    
+    # One pass over the password instead of a regex scan per character class
+    has_upper = has_lower = has_digit = False
+    for c in password:
+        if 'A' <= c <= 'Z':
+            has_upper = True
+        elif 'a' <= c <= 'z':
+            has_lower = True
+        elif c.isdecimal():  # same characters as \d
+            has_digit = True
+        if has_upper and has_lower and has_digit:
+            break
+    
+    if not has_upper:
         return False, "Password must contain at least one uppercase letter"
-    if not re.search(r'[a-z]', password):
+    if not has_lower:
         return False, "Password must contain at least one lowercase letter"
-    if not re.search(r'\d', password):
+    if not has_digit:
         return False, "Password must contain at least one number"
     return True, "Valid password"
 
+@lru_cache(maxsize=1)
+def dummy_password_hash():
+    """Hash checked against for unknown emails, made with the same KDF and
+    cost as real password hashes"""
+    return generate_password_hash(secrets.token_urlsafe(16))
+
+def dashboard_url(role):
+    """Return the dashboard path for a role, resolved once per app rather
+    than through the URL map on every login and index redirect"""
+    urls = current_app.extensions.get('dashboard_urls')
+    if urls is None:
+        urls = current_app.extensions['dashboard_urls'] = {
+            'admin': url_for('admin_dashboard'),
+            'teacher': url_for('teacher_dashboard'),
+            'student': url_for('student_dashboard')
+        }
+    return urls.get(role, urls['student'])
+
+def request_data():
+    """Return the submitted fields: the JSON body or the form itself. Both
+    support .get(key, default), so the form is not copied into a dict."""
+    if request.is_json:
+        return request.get_json()
+    return request.form
+
+def error_response(error, status, template=None, redirect_to=None):
+    """Return an error as JSON for API clients, or flash it and render the
+    template (or redirect) for form submissions"""
+    if request.is_json:
+        return jsonify({'error': error}), status
+    flash(error, 'error')
+    if redirect_to is not None:
+        return redirect(redirect_to)
+    return render_template(template)
+
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
-        # Handle both form data and JSON
-        if request.is_json:
-            data = request.get_json()
-        else:
-            data = request.form.to_dict()
+        data = request_data()
         
         username = data.get('username', '').strip()
         email = data.get('email', '').strip().lower()
@@ -41,40 +90,14 @@ def register():
         
         # Validation
         if not username or len(username) < 3:
-            error = "Username must be at least 3 characters long"
-            if request.is_json:
-                return jsonify({'error': error}), 400
-            flash(error, 'error')
-            return render_template('register.html')
+            return error_response("Username must be at least 3 characters long", 400, 'register.html')
         
         if not validate_email(email):
-            error = "Please enter a valid email address"
-            if request.is_json:
-                return jsonify({'error': error}), 400
-            flash(error, 'error')
-            return render_template('register.html')
+            return error_response("Please enter a valid email address", 400, 'register.html')
         
         is_valid_password, password_message = validate_password(password)
         if not is_valid_password:
-            if request.is_json:
-                return jsonify({'error': password_message}), 400
-            flash(password_message, 'error')
-            return render_template('register.html')
-        
-        # Check if user already exists
-        if User.query.filter_by(username=username).first():
-            error = "Username already exists"
-            if request.is_json:
-                return jsonify({'error': error}), 400
-            flash(error, 'error')
-            return render_template('register.html')
-        
-        if User.query.filter_by(email=email).first():
-            error = "Email already registered"
-            if request.is_json:
-                return jsonify({'error': error}), 400
-            flash(error, 'error')
-            return render_template('register.html')
+            return error_response(password_message, 400, 'register.html')
         
         # Validate role
         if role not in ['student', 'teacher', 'admin']:
@@ -103,40 +126,44 @@ def register():
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('auth.login'))
             
+        except IntegrityError as e:
+            # The unique indexes on username and email reject duplicates, so
+            # no SELECT is needed beforehand and concurrent sign-ups cannot
+            # both succeed
+            db.session.rollback()
+            if 'username' in str(e.orig):
+                return error_response("Username already exists", 400, 'register.html')
+            return error_response("Email already registered", 400, 'register.html')
         except Exception as e:
             db.session.rollback()
-            error = "Registration failed. Please try again."
-            if request.is_json:
-                return jsonify({'error': error}), 500
-            flash(error, 'error')
-            return render_template('register.html')
+            return error_response("Registration failed. Please try again.", 500, 'register.html')
     
     return render_template('register.html')
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        # Handle both form data and JSON
-        if request.is_json:
-            data = request.get_json()
-        else:
-            data = request.form.to_dict()
+        data = request_data()
         
         email = data.get('email', '').strip()
         password = data.get('password', '')
         remember_me = data.get('remember_me', False)
         
         if not email or not password:
-            error = "Please enter both email and password"
-            if request.is_json:
-                return jsonify({'error': error}), 400
-            flash(error, 'error')
-            return render_template('login.html')
+            return error_response("Please enter both email and password", 400, 'login.html')
         
         # Find user by email
         user = User.query.filter_by(email=email.lower()).first()
         
-        if user and user.check_password(password) and user.is_active:
+        if user is None:
+            # Run the KDF anyway so the response time does not reveal
+            # whether the email is registered
+            check_password_hash(dummy_password_hash(), password)
+            password_ok = False
+        else:
+            password_ok = user.check_password(password)
+        
+        if password_ok and user.is_active:
             login_user(user, remember=remember_me)
             user.update_last_login()
             
@@ -149,20 +176,11 @@ def login():
             # Redirect based on role
             next_page = request.args.get('next')
             if not next_page:
-                if user.is_admin():
-                    next_page = url_for('admin_dashboard')
-                elif user.is_teacher():
-                    next_page = url_for('teacher_dashboard')
-                else:
-                    next_page = url_for('student_dashboard')
+                next_page = dashboard_url(user.role)
             
             return redirect(next_page)
         else:
-            error = "Invalid credentials or account inactive"
-            if request.is_json:
-                return jsonify({'error': error}), 401
-            flash(error, 'error')
-            return render_template('login.html')
+            return error_response("Invalid credentials or account inactive", 401, 'login.html')
     
     return render_template('login.html')
 
@@ -179,11 +197,7 @@ def logout():
 @login_required
 def profile():
     if request.method == 'POST':
-        # Handle both form data and JSON
-        if request.is_json:
-            data = request.get_json()
-        else:
-            data = request.form.to_dict()
+        data = request_data()
         
         first_name = data.get('first_name', '').strip()
         last_name = data.get('last_name', '').strip()
@@ -220,36 +234,21 @@ def profile():
 @auth_bp.route('/change-password', methods=['POST'])
 @login_required
 def change_password():
-    # Handle both form data and JSON
-    if request.is_json:
-        data = request.get_json()
-    else:
-        data = request.form.to_dict()
+    data = request_data()
     
     current_password = data.get('current_password', '')
     new_password = data.get('new_password', '')
     confirm_password = data.get('confirm_password', '')
     
     if not current_user.check_password(current_password):
-        error = "Current password is incorrect"
-        if request.is_json:
-            return jsonify({'error': error}), 400
-        flash(error, 'error')
-        return redirect(url_for('auth.profile'))
+        return error_response("Current password is incorrect", 400, redirect_to=url_for('auth.profile'))
     
     if new_password != confirm_password:
-        error = "New passwords do not match"
-        if request.is_json:
-            return jsonify({'error': error}), 400
-        flash(error, 'error')
-        return redirect(url_for('auth.profile'))
+        return error_response("New passwords do not match", 400, redirect_to=url_for('auth.profile'))
     
     is_valid, message = validate_password(new_password)
     if not is_valid:
-        if request.is_json:
-            return jsonify({'error': message}), 400
-        flash(message, 'error')
-        return redirect(url_for('auth.profile'))
+        return error_response(message, 400, redirect_to=url_for('auth.profile'))
     
     try:
         current_user.set_password(new_password)
@@ -263,8 +262,4 @@ def change_password():
         
     except Exception as e:
         db.session.rollback()
-        error = "Failed to change password"
-        if request.is_json:
-            return jsonify({'error': error}), 500
-        flash(error, 'error')
-        return redirect(url_for('auth.profile'))
+        return error_response("Failed to change password", 500, redirect_to=url_for('auth.profile'))
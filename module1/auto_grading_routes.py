@@ -1,18 +1,70 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, current_app, request, jsonify, render_template, stream_with_context
 from flask_login import login_required, current_user
 from auto_grading_models import (
     AutoGradingModel, GradingCriteria, AutoGradingResult, 
-    HumanReview, GradingAnalytics, grading_engine
+    HumanReview, GradingAnalytics, GradingType, EvaluationCriteria, grading_engine,
+    active_model_for, criteria_for_questions
 )
 from adaptive_assessment_models import AdaptiveQuestion, AssessmentResponse
 from models import db
-import json
+import tasks
+import numpy as np
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+from sqlalchemy import case, func, desc, insert, select
+from sqlalchemy.orm import joinedload, raiseload, selectinload
 import time
 
 auto_grading_bp = Blueprint('auto_grading', __name__)
 
+# Results below this confidence are queued for human review
+REVIEW_CONFIDENCE_THRESHOLD = 0.7
+# Overall scores from this one up mark the response as correct
+CORRECT_SCORE_THRESHOLD = 7.0
+# Pending reviews fetched and streamed per batch
+PENDING_REVIEWS_BATCH = 200
+
+GRADING_TYPES = frozenset(t.value for t in GradingType)
+CRITERIA_TYPES = frozenset(c.value for c in EvaluationCriteria)
+
+def default_model(question_type):
+    """The active grading model for a question type, if it can be auto-graded"""
+    # The grading_type enum rejects other values, so don't query for them
+    if question_type not in GRADING_TYPES:
+        return None
+    return active_model_for(question_type)
+
+def run_grading(model, answer, criteria_dict):
+    """Grade an answer with a model, returning the result and the time it took"""
+    start_time = time.time()
+    result = grading_engine.grade(model.grading_type, [answer], criteria_dict, model.model_config)[0]
+    return result, time.time() - start_time
+
+def grading_result_values(response_id, model, result, processing_time, needs_human_review=None):
+    """Column values for the AutoGradingResult of a graded response"""
+    if needs_human_review is None:
+        needs_human_review = result['confidence_score'] < REVIEW_CONFIDENCE_THRESHOLD
+    return {
+        'response_id': response_id,
+        'model_id': model.id,
+        'overall_score': result['overall_score'],
+        'confidence_score': result['confidence_score'],
+        'criteria_scores': result['criteria_scores'],
+        'feedback_text': result['feedback_text'],
+        'suggestions': result['suggestions'],
+        'strengths': result['strengths'],
+        'weaknesses': result['weaknesses'],
+        'processing_time': processing_time,
+        'model_version': model.version,
+        'needs_human_review': needs_human_review
+    }
+
+def apply_grade(response, result, is_correct=None):
+    """Record the AI grade on the response"""
+    if is_correct is None:
+        is_correct = result['overall_score'] >= CORRECT_SCORE_THRESHOLD
+    response.points_earned = result['overall_score']
+    response.is_correct = is_correct
+
 @auto_grading_bp.route('/models', methods=['GET'])
 @login_required
 def get_grading_models():
@@ -23,7 +75,7 @@ def get_grading_models():
             'message': 'Access denied'
         }), 403
     
-    models = AutoGradingModel.query.filter_by(is_active=True).all()
+    models = AutoGradingModel.query.filter_by(is_active=True).options(raiseload('*')).all()
     
     return jsonify({
         'success': True,
@@ -42,11 +94,17 @@ def create_grading_model():
     
     data = request.get_json()
     
+    if data['grading_type'] not in GRADING_TYPES:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid grading type'
+        }), 400
+    
     model = AutoGradingModel(
         name=data['name'],
         model_type=data['model_type'],
         grading_type=data['grading_type'],
-        model_config=json.dumps(data.get('model_config', {})),
+        model_config=data.get('model_config', {}),
         description=data.get('description'),
         created_by=current_user.id
     )
@@ -69,7 +127,7 @@ def auto_grade_response():
     model_id = data.get('model_id')
     
     # Get the response
-    response = AssessmentResponse.query.get(response_id)
+    response = db.session.get(AssessmentResponse, response_id)
     if not response:
         return jsonify({
             'success': False,
@@ -78,12 +136,9 @@ def auto_grade_response():
     
     # Get or create default model
     if model_id:
-        model = AutoGradingModel.query.get(model_id)
+        model = db.session.get(AutoGradingModel, model_id)
     else:
-        model = AutoGradingModel.query.filter_by(
-            grading_type=response.question.question_type,
-            is_active=True
-        ).first()
+        model = default_model(response.question.question_type)
     
     if not model:
         return jsonify({
@@ -92,68 +147,18 @@ def auto_grade_response():
         }), 400
     
     # Get grading criteria
-    criteria = GradingCriteria.query.filter_by(question_id=response.question_id).all()
-    criteria_dict = {
-        c.criteria_type: {
-            'weight': c.weight,
-            'max_score': c.max_score,
-            'keywords': json.loads(c.keywords) if c.keywords else [],
-            'rubric_points': json.loads(c.rubric_points) if c.rubric_points else []
-        }
-        for c in criteria
-    }
-    
-    # Start timing
-    start_time = time.time()
+    criteria_dict = criteria_for_questions([response.question_id])[response.question_id]
     
     # Grade the response
-    if model.grading_type == 'essay':
-        result = grading_engine.grade_essay(
-            response.user_answer, 
-            criteria_dict,
-            json.loads(model.model_config) if model.model_config else {}
-        )
-    elif model.grading_type == 'code':
-        result = grading_engine.grade_code(
-            response.user_answer,
-            [],  # test_cases would come from question
-            criteria_dict
-        )
-    else:
-        # Default grading for other types
-        result = {
-            'overall_score': 7.0,
-            'criteria_scores': {'content': 7.0},
-            'feedback_text': 'Response graded successfully.',
-            'suggestions': ['Good work!'],
-            'strengths': ['Clear response'],
-            'weaknesses': [],
-            'confidence_score': 0.8
-        }
-    
-    processing_time = time.time() - start_time
+    result, processing_time = run_grading(model, response.user_answer, criteria_dict)
     
     # Create grading result
-    grading_result = AutoGradingResult(
-        response_id=response_id,
-        model_id=model.id,
-        overall_score=result['overall_score'],
-        confidence_score=result['confidence_score'],
-        criteria_scores=json.dumps(result['criteria_scores']),
-        feedback_text=result['feedback_text'],
-        suggestions=json.dumps(result['suggestions']),
-        strengths=json.dumps(result['strengths']),
-        weaknesses=json.dumps(result['weaknesses']),
-        processing_time=processing_time,
-        model_version=model.version,
-        needs_human_review=result['confidence_score'] < 0.7
-    )
+    grading_result = AutoGradingResult(**grading_result_values(response_id, model, result, processing_time))
     
     db.session.add(grading_result)
     
     # Update response with AI grade
-    response.points_earned = result['overall_score']
-    response.is_correct = result['overall_score'] >= 7.0  # Threshold for correctness
+    apply_grade(response, result)
     
     db.session.commit()
     
@@ -163,11 +168,102 @@ def auto_grade_response():
         'result': grading_result.to_dict()
     })
 
+@auto_grading_bp.route('/grade/batch', methods=['POST'])
+@login_required
+def auto_grade_batch():
+    """Auto-grade a batch of responses"""
+    if not current_user.is_teacher() and not current_user.is_admin():
+        return jsonify({
+            'success': False,
+            'message': 'Only teachers and admins can batch grade responses'
+        }), 403
+    
+    data = request.get_json()
+    response_ids = data.get('response_ids') or []
+    model_id = data.get('model_id')
+    
+    responses = AssessmentResponse.query.filter(
+        AssessmentResponse.id.in_(response_ids)
+    ).options(selectinload(AssessmentResponse.question)).all()
+    
+    if not responses:
+        return jsonify({
+            'success': False,
+            'message': 'No responses found'
+        }), 404
+    
+    # Criteria for every question in the batch; uncached ones in one query
+    criteria_by_question = criteria_for_questions(r.question_id for r in responses)
+    
+    fixed_model = db.session.get(AutoGradingModel, model_id) if model_id else None
+    models_by_type = {}
+    
+    skipped = []
+    # Responses sharing a model and question are graded together as one job
+    groups = {}
+    for response in responses:
+        model = fixed_model
+        if model is None:
+            question_type = response.question.question_type
+            if question_type not in models_by_type:
+                models_by_type[question_type] = default_model(question_type)
+            model = models_by_type[question_type]
+        
+        if not model:
+            skipped.append(response.id)
+            continue
+        
+        groups.setdefault((model, response.question_id), []).append(response)
+    
+    start_time = time.time()
+    job_results = grading_engine.grade_batch([
+        (model.grading_type, [response.user_answer for response in group],
+         criteria_by_question.get(question_id, {}), model.model_config)
+        for (model, question_id), group in groups.items()
+    ])
+    
+    graded = [
+        (model, response, result)
+        for ((model, _), group), results in zip(groups.items(), job_results)
+        for response, result in zip(group, results)
+    ]
+    # The batch is timed as a whole, so each result records its share
+    processing_time = (time.time() - start_time) / max(len(graded), 1)
+    
+    # Both thresholds are applied to the whole batch in one comparison each
+    confidence = np.fromiter((result['confidence_score'] for _, _, result in graded),
+                             dtype=float, count=len(graded))
+    overall = np.fromiter((result['overall_score'] for _, _, result in graded),
+                          dtype=float, count=len(graded))
+    needs_review = (confidence < REVIEW_CONFIDENCE_THRESHOLD).tolist()
+    correct = (overall >= CORRECT_SCORE_THRESHOLD).tolist()
+    
+    rows = []
+    for (model, response, result), review, is_correct in zip(graded, needs_review, correct):
+        rows.append(grading_result_values(response.id, model, result, processing_time, review))
+        apply_grade(response, result, is_correct)
+    
+    # One executemany INSERT for the whole batch instead of a unit-of-work
+    # flush per result; the response updates are flushed as one executemany too
+    if rows:
+        db.session.execute(insert(AutoGradingResult), rows)
+    db.session.commit()
+    
+    if rows:
+        tasks.submit(tasks.refresh_grading_analytics, sorted({row['model_id'] for row in rows}))
+    
+    return jsonify({
+        'success': True,
+        'message': f'{len(rows)} responses graded successfully',
+        'graded': len(rows),
+        'skipped': skipped
+    })
+
 @auto_grading_bp.route('/responses/<int:response_id>/grade', methods=['GET'])
 @login_required
 def get_grading_result(response_id):
     """Get grading result for a response"""
-    response = AssessmentResponse.query.get(response_id)
+    response = db.session.get(AssessmentResponse, response_id)
     if not response:
         return jsonify({
             'success': False,
@@ -181,7 +277,7 @@ def get_grading_result(response_id):
             'message': 'Access denied'
         }), 403
     
-    grading_result = AutoGradingResult.query.filter_by(response_id=response_id).first()
+    grading_result = AutoGradingResult.query.filter_by(response_id=response_id).options(raiseload('*')).first()
     
     if not grading_result:
         return jsonify({
@@ -208,7 +304,7 @@ def submit_human_review():
     data = request.get_json()
     grading_result_id = data['grading_result_id']
     
-    grading_result = AutoGradingResult.query.get(grading_result_id)
+    grading_result = db.session.get(AutoGradingResult, grading_result_id)
     if not grading_result:
         return jsonify({
             'success': False,
@@ -250,29 +346,42 @@ def get_pending_reviews():
             'message': 'Access denied'
         }), 403
     
-    pending_results = AutoGradingResult.query.filter_by(needs_human_review=True).all()
-    
-    results = []
-    for result in pending_results:
-        response = result.response
-        question = response.question
-        user = response.user
-        
-        results.append({
-            'grading_result': result.to_dict(),
-            'response': response.to_dict(),
-            'question': question.to_dict(),
-            'user': {
-                'id': user.id,
-                'name': user.get_full_name(),
-                'email': user.email
-            }
-        })
-    
-    return jsonify({
-        'success': True,
-        'pending_reviews': results
-    })
+    # Each result is rendered with its response, question and student. All
+    # three are required many-to-one links, so they are inner-joined into
+    # the one SELECT instead of being loaded per result
+    response_path = joinedload(AutoGradingResult.response, innerjoin=True)
+    stmt = select(AutoGradingResult).filter_by(needs_human_review=True).options(
+        response_path.joinedload(AssessmentResponse.question, innerjoin=True),
+        response_path.joinedload(AssessmentResponse.user, innerjoin=True)
+    )
+    dumpb = current_app.json.dumpb
+    
+    # The queue can be long, so rows are fetched and written out in batches
+    # of PENDING_REVIEWS_BATCH rather than building the whole list first
+    def generate():
+        yield b'{"success":true,"pending_reviews":['
+        separator = b''
+        results = db.session.scalars(stmt, execution_options={'yield_per': PENDING_REVIEWS_BATCH})
+        for partition in results.partitions():
+            items = []
+            for result in partition:
+                response = result.response
+                user = response.user
+                items.append(dumpb({
+                    'grading_result': result.to_dict(),
+                    'response': response.to_dict(),
+                    'question': response.question.to_dict(),
+                    'user': {
+                        'id': user.id,
+                        'name': user.get_full_name(),
+                        'email': user.email
+                    }
+                }))
+            yield separator + b','.join(items)
+            separator = b','
+        yield b']}'
+    
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
 
 @auto_grading_bp.route('/analytics', methods=['GET'])
 @login_required
@@ -284,16 +393,18 @@ def get_grading_analytics():
             'message': 'Access denied'
         }), 403
     
-    # Get overall statistics
-    total_graded = AutoGradingResult.query.count()
-    total_models = AutoGradingModel.query.count()
-    pending_reviews = AutoGradingResult.query.filter_by(needs_human_review=True).count()
-    
-    # Get average processing time
-    avg_processing_time = db.session.query(func.avg(AutoGradingResult.processing_time)).scalar() or 0
-    
-    # Get average confidence
-    avg_confidence = db.session.query(func.avg(AutoGradingResult.confidence_score)).scalar() or 0
+    # Get overall statistics, averages and the model count in one round trip
+    total_graded, pending_reviews, avg_processing_time, avg_confidence, total_models = db.session.query(
+        func.count(AutoGradingResult.id),
+        func.sum(case((AutoGradingResult.needs_human_review == True, 1), else_=0)),
+        func.avg(AutoGradingResult.processing_time),
+        func.avg(AutoGradingResult.confidence_score),
+        select(func.count(AutoGradingModel.id)).scalar_subquery()
+    ).one()
+    # SUM and AVG over an empty table are NULL
+    pending_reviews = pending_reviews or 0
+    avg_processing_time = avg_processing_time or 0
+    avg_confidence = avg_confidence or 0
     
     # Get model performance
     model_performance = db.session.query(
@@ -303,7 +414,7 @@ def get_grading_analytics():
     ).join(AutoGradingResult).group_by(AutoGradingModel.id).all()
     
     # Get recent grading activity
-    recent_gradings = AutoGradingResult.query.order_by(
+    recent_gradings = AutoGradingResult.query.options(raiseload('*')).order_by(
         desc(AutoGradingResult.graded_at)
     ).limit(10).all()
     
@@ -339,14 +450,20 @@ def create_grading_criteria():
     
     data = request.get_json()
     
+    if data['criteria_type'] not in CRITERIA_TYPES:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid criteria type'
+        }), 400
+    
     criteria = GradingCriteria(
         question_id=data['question_id'],
         criteria_type=data['criteria_type'],
         weight=data.get('weight', 1.0),
         max_score=data.get('max_score', 10.0),
         description=data.get('description'),
-        rubric_points=json.dumps(data.get('rubric_points', [])),
-        keywords=json.dumps(data.get('keywords', []))
+        rubric_points=data.get('rubric_points', []),
+        keywords=data.get('keywords', [])
     )
     
     db.session.add(criteria)
@@ -404,20 +521,19 @@ def quick_grading_stats():
             'message': 'Access denied'
         }), 403
     
-    # Get today's statistics
-    today = datetime.utcnow().date()
-    today_gradings = AutoGradingResult.query.filter(
-        func.date(AutoGradingResult.graded_at) == today
-    ).count()
-    
-    # Get pending reviews
-    pending_reviews = AutoGradingResult.query.filter_by(needs_human_review=True).count()
-    
-    # Get average confidence
-    avg_confidence = db.session.query(func.avg(AutoGradingResult.confidence_score)).scalar() or 0
-    
-    # Get model count
-    active_models = AutoGradingModel.query.filter_by(is_active=True).count()
+    # Today's count, pending reviews, average confidence and the active model
+    # count in one scan and one round trip. Today is a range on graded_at
+    # rather than DATE(graded_at), so the index is used.
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_gradings, pending_reviews, avg_confidence, active_models = db.session.query(
+        func.count().filter(AutoGradingResult.graded_at >= today,
+                            AutoGradingResult.graded_at < today + timedelta(days=1)),
+        func.count().filter(AutoGradingResult.needs_human_review == True),
+        func.avg(AutoGradingResult.confidence_score),
+        select(func.count(AutoGradingModel.id)).filter_by(is_active=True).scalar_subquery()
+    ).select_from(AutoGradingResult).one()
+    # AVG over an empty table is NULL
+    avg_confidence = avg_confidence or 0
     
     return jsonify({
         'success': True,
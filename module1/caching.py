@@ -0,0 +1,13 @@
+from flask import request
+from flask_caching import Cache
+from flask_login import current_user
+
+cache = Cache()
+
+def user_cache_key(path=None, user_id=None):
+    """Cache key for views whose response depends on the logged-in user"""
+    if path is None:
+        path = request.path
+        if request.query_string:
+            path += '?' + request.query_string.decode()
+    return f"view/{user_id or current_user.id}{path}"
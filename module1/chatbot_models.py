@@ -1,9 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event
 from models import db
+import time
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        # A user's latest messages, newest first (chat history)
+        db.Index('ix_cm_user_time', 'user_id', 'timestamp', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -22,7 +28,7 @@ class ChatMessage(db.Model):
             'message': self.message,
             'response': self.response,
             'message_type': self.message_type,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+            'timestamp': self.timestamp
         }
 
 class FAQ(db.Model):
@@ -44,6 +50,28 @@ class FAQ(db.Model):
             'is_active': self.is_active
         }
 
+# Active FAQs as dicts, shared by the chat page and the FAQ endpoint. FAQ
+# edits in this process drop the cache at once; other processes see them
+# within FAQ_CACHE_TTL seconds.
+_active_faqs = []
+FAQ_CACHE_TTL = 300
+
+def active_faqs():
+    """The active FAQs as dicts"""
+    now = time.monotonic()
+    if _active_faqs and _active_faqs[0][0] > now:
+        return _active_faqs[0][1]
+    
+    faqs = [faq.to_dict() for faq in FAQ.query.filter_by(is_active=True)]
+    _active_faqs[:] = [(now + FAQ_CACHE_TTL, faqs)]
+    return faqs
+
+@event.listens_for(FAQ, 'after_insert')
+@event.listens_for(FAQ, 'after_update')
+@event.listens_for(FAQ, 'after_delete')
+def _invalidate_active_faqs(mapper, connection, target):
+    _active_faqs.clear()
+
 class StudyReminder(db.Model):
     __tablename__ = 'study_reminders'
     
@@ -64,7 +92,7 @@ class StudyReminder(db.Model):
             'user_id': self.user_id,
             'title': self.title,
             'description': self.description,
-            'reminder_time': self.reminder_time.isoformat() if self.reminder_time else None,
+            'reminder_time': self.reminder_time,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
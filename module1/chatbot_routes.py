@@ -1,10 +1,10 @@
 from flask import Blueprint, request, render_template, redirect, url_for, flash, jsonify, session, current_app
-import google.generativeai as genai
 from flask_login import login_required, current_user
 from models import db, User
-from chatbot_models import ChatMessage, FAQ, StudyReminder
+from chatbot_models import ChatMessage, FAQ, StudyReminder, active_faqs
+from gemini import get_chat_model, get_response_cache, normalize_message
 from datetime import datetime, timedelta
-import json
+import re
 
 chatbot_bp = Blueprint('chatbot', __name__)
 
@@ -20,6 +20,12 @@ FAQ_RESPONSES = {
     "support": "For technical support, please contact our support team at support@edulearn.com or use the feedback form."
 }
 
+# Every keyword mentioned in a message, found in one regex pass; the
+# lookahead lets keywords that overlap in the message all be found. When
+# several match, the one listed first in FAQ_RESPONSES wins.
+FAQ_KEYWORD_PATTERN = re.compile('(?=(%s))' % '|'.join(map(re.escape, FAQ_RESPONSES)))
+FAQ_KEYWORD_RANK = {keyword: rank for rank, keyword in enumerate(FAQ_RESPONSES)}
+
 STUDY_REMINDERS = {
     "daily": "Don't forget to complete your daily learning goal!",
     "weekly": "Review your weekly progress and set new learning objectives.",
@@ -33,17 +39,14 @@ def chat():
     """Render the chat interface"""
     # Get recent chat history
     recent_messages = ChatMessage.query.filter_by(user_id=current_user.id)\
-        .order_by(ChatMessage.timestamp.desc())\
+        .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())\
         .limit(20)\
         .all()
     
-    # Get FAQs
-    faqs = FAQ.query.filter_by(is_active=True).all()
-    
     return render_template('chatbot/chat.html', 
                           user=current_user, 
                           messages=reversed(recent_messages),
-                          faqs=faqs)
+                          faqs=active_faqs())
 
 @chatbot_bp.route('/chat/send', methods=['POST'])
 @login_required
@@ -55,26 +58,26 @@ def send_message():
     if not user_message:
         return jsonify({'error': 'Message is required'}), 400
     
-    # Save user message
+    # The user message is stamped on arrival, before the reply is generated
     chat_message = ChatMessage(
         user_id=current_user.id,
         message=user_message,
-        message_type='user'
+        message_type='user',
+        timestamp=datetime.utcnow()
     )
-    db.session.add(chat_message)
-    db.session.commit()
     
     # Generate bot response
-    bot_response = generate_response(user_message)
+    bot_response = generate_response(user_message, current_user.id)
     
-    # Save bot response
+    # The bot row only carries the reply; the question is on the user row
     response_message = ChatMessage(
         user_id=current_user.id,
-        message=user_message,
+        message='',
         response=bot_response,
         message_type='bot'
     )
-    db.session.add(response_message)
+    # Both rows are saved in one transaction
+    db.session.add_all([chat_message, response_message])
     db.session.commit()
     
     return jsonify({
@@ -125,19 +128,29 @@ def create_reminder():
         'reminder': reminder.to_dict()
     })
 
-import google.generativeai as genai
-
-def generate_response(user_message):
+def generate_response(user_message, user_id=None):
     # First, check for rule-based responses
-    for keyword, response in FAQ_RESPONSES.items():
-        if keyword in user_message.lower():
-            return response
-
+    keywords = FAQ_KEYWORD_PATTERN.findall(user_message.lower())
+    if keywords:
+        return FAQ_RESPONSES[min(keywords, key=FAQ_KEYWORD_RANK.__getitem__)]
+
+    # Reuse the reply if this user already asked the same thing (ignoring
+    # case, punctuation and spacing) before asking Gemini
+    response_cache = get_response_cache()
+    cache_key = (user_id, normalize_message(user_message))
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     # If no rule-based response, use Gemini
     try:
-        # Use the newer gemini-1.5-flash model which is more reliable
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(user_message)
+        # A slow call gives up after GEMINI_TIMEOUT seconds rather than
+        # holding the worker thread
+        response = get_chat_model().generate_content(
+            user_message,
+            request_options={'timeout': current_app.config['GEMINI_TIMEOUT']}
+        )
+        response_cache.add(cache_key, response.text)
         return response.text
     except Exception as e:
         print(f"Error generating Gemini response: {e}")
@@ -148,8 +161,7 @@ def generate_response(user_message):
 @login_required
 def get_faqs():
     """Get all active FAQs"""
-    faqs = FAQ.query.filter_by(is_active=True).all()
-    return jsonify([faq.to_dict() for faq in faqs])
+    return jsonify(active_faqs())
 
 # Admin routes for managing FAQs
 @chatbot_bp.route('/admin/faqs')
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -7,6 +8,30 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your_secret_key'
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') or 'your_gemini_api_key'
+    GEMINI_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT') or 10)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///education_platform.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connections are checked before use and recycled before server-side
+    # idle timeouts drop them. The pool is sized for the worker's request
+    # threads plus the background job threads (tasks.py) sharing the engine.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+    if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS.update(
+            pool_size=int(os.environ.get('DB_POOL_SIZE') or 20),
+            max_overflow=int(os.environ.get('DB_MAX_OVERFLOW') or 30),
+        )
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
+    
+    # Response cache for read-only analytics endpoints
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'SimpleCache'
+    CACHE_DEFAULT_TIMEOUT = 60
+    
+    # Chatbot replies are reused when a user repeats a message (gemini.py)
+    CHAT_CACHE_SIZE = int(os.environ.get('CHAT_CACHE_SIZE') or 10000)
+    
+    # Compiled Jinja templates are kept on disk so new workers skip compiling
+    # them. Template auto-reload is left to follow DEBUG (off in production).
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'edulearn-jinja')
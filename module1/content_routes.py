@@ -4,11 +4,13 @@ from werkzeug.utils import secure_filename
 import os
 import uuid
 from datetime import datetime
+from sqlalchemy import func, select
 from content_models import (
     db, Course, Topic, LearningMaterial, Video, Quiz, QuizQuestion, 
     QuizOption, Assignment, Enrollment, QuizAttempt, QuizAnswer, AssignmentSubmission
 )
 from models import User
+from caching import cache, user_cache_key
 
 content_bp = Blueprint('content', __name__)
 
@@ -78,6 +80,7 @@ def create_course():
         
         db.session.add(course)
         db.session.commit()
+        cache.delete(user_cache_key(url_for('teacher_dashboard')))
         
         flash('Course created successfully!', 'success')
         return redirect(url_for('content.courses'))
@@ -414,7 +417,10 @@ def enroll_course(course_id):
         return redirect(url_for('content.view_course', course_id=course_id))
     
     # Check if course is full
-    current_enrollments = Enrollment.query.filter_by(course_id=course_id, is_active=True).count()
+    current_enrollments = db.session.scalar(select(func.count()).select_from(Enrollment).where(
+        Enrollment.course_id == course_id,
+        Enrollment.is_active == True
+    ))
     if current_enrollments >= course.max_students:
         flash('This course is full.', 'error')
         return redirect(url_for('content.courses'))
@@ -427,6 +433,12 @@ def enroll_course(course_id):
     db.session.add(enrollment)
     db.session.commit()
     
+    # Both dashboards show this enrollment
+    cache.delete_many(
+        user_cache_key(url_for('student_dashboard')),
+        user_cache_key(url_for('teacher_dashboard'), user_id=course.instructor_id)
+    )
+    
     flash(f'Successfully enrolled in {course.title}!', 'success')
     return redirect(url_for('content.view_course', course_id=course_id))
 
@@ -452,10 +464,10 @@ def take_quiz(quiz_id):
         return redirect(url_for('content.courses'))
     
     # Check attempts
-    attempts = QuizAttempt.query.filter_by(
-        student_id=current_user.id, 
-        quiz_id=quiz_id
-    ).count()
+    attempts = db.session.scalar(select(func.count()).select_from(QuizAttempt).where(
+        QuizAttempt.student_id == current_user.id,
+        QuizAttempt.quiz_id == quiz_id
+    ))
     
     if attempts >= quiz.max_attempts:
         flash(f'You have reached the maximum number of attempts ({quiz.max_attempts}) for this quiz.', 'error')
@@ -481,7 +493,7 @@ def take_quiz(quiz_id):
             if question.question_type == 'multiple_choice':
                 selected_option_id = request.form.get(f'question_{question.id}')
                 if selected_option_id:
-                    selected_option = QuizOption.query.get(selected_option_id)
+                    selected_option = db.session.get(QuizOption, selected_option_id)
                     is_correct = selected_option and selected_option.is_correct
                     points_earned = question.points if is_correct else 0
                     
@@ -364,15 +364,14 @@ class GamificationEngine:
         """Check if user should earn any badges"""
         from gamification_models import Badge, UserBadge
         
-        # Get user's current badges
-        user_badges = UserBadge.query.filter_by(user_id=user_id).all()
-        earned_badge_ids = [ub.badge_id for ub in user_badges]
+        # Badges the user already holds are excluded in SQL
+        earned_badge_ids = db.session.query(UserBadge.badge_id).filter_by(user_id=user_id)
         
         # Get applicable badges
         applicable_badges = Badge.query.filter(
             Badge.criteria_type == activity_type,
             Badge.is_active == True,
-            ~Badge.id.in_(earned_badge_ids)
+            ~Badge.id.in_(earned_badge_ids.scalar_subquery())
         ).all()
         
         new_badges = []
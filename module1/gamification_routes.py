@@ -7,7 +7,7 @@ from gamification_models import (
 from models import db
 import json
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, select
 
 gamification_bp = Blueprint('gamification', __name__)
 
@@ -164,7 +164,7 @@ def get_leaderboard_entries(leaderboard_id):
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
-    leaderboard = Leaderboard.query.get(leaderboard_id)
+    leaderboard = db.session.get(Leaderboard, leaderboard_id)
     if not leaderboard:
         return jsonify({
             'success': False,
@@ -368,10 +368,10 @@ def get_user_stats():
     ).order_by(desc(Achievement.completed_at)).limit(5).all()
     
     # Get unread notifications count
-    unread_count = Notification.query.filter_by(
-        user_id=current_user.id,
-        is_read=False
-    ).count()
+    unread_count = db.session.scalar(select(func.count()).select_from(Notification).where(
+        Notification.user_id == current_user.id,
+        Notification.is_read == False
+    ))
     
     # Get leaderboard rankings
     user_rankings = []
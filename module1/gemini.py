@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from functools import lru_cache
+from flask import current_app
+import re
+import threading
+
+@lru_cache(maxsize=1)
+def get_genai():
+    """Return the google.generativeai module, configured on first use.
+
+    The SDK pulls in grpc and protobuf, so it is only imported once a
+    chatbot request actually needs it rather than when the app starts.
+    """
+    import google.generativeai as genai
+    genai.configure(api_key=current_app.config['GEMINI_API_KEY'])
+    return genai
+
+@lru_cache(maxsize=1)
+def get_chat_model():
+    """Return the chatbot's Gemini model, created on first use.
+
+    The model object holds no conversation state, so every request shares
+    it (and its client connection) instead of building a new one.
+    """
+    return get_genai().GenerativeModel('gemini-1.5-flash')
+
+NON_WORD_PATTERN = re.compile(r'[\W_]+')
+
+def normalize_message(text):
+    """The message with case, punctuation and spacing differences removed"""
+    return NON_WORD_PATTERN.sub(' ', text.casefold()).strip()
+
+class ResponseCache:
+    """Gemini replies keyed by (user id, normalized message).
+
+    Only a message that normalizes to exactly the same text as an earlier
+    one from the same user gets the cached reply. When full, the least
+    recently used entry is dropped.
+    """
+    
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            response = self._responses.get(key)
+            if response is not None:
+                self._responses.move_to_end(key)
+            return response
+    
+    def add(self, key, response):
+        with self._lock:
+            self._responses[key] = response
+            self._responses.move_to_end(key)
+            if len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+
+def get_response_cache():
+    """Return the Gemini response cache of the current app, creating it on first use"""
+    cache = current_app.extensions.get('gemini_response_cache')
+    if cache is None:
+        cache = current_app.extensions['gemini_response_cache'] = ResponseCache(
+            current_app.config['CHAT_CACHE_SIZE']
+        )
+    return cache
@@ -0,0 +1,30 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson.
+
+    orjson formats datetimes and numpy values natively, so model to_dict
+    methods can hand back raw column values. Naive datetimes are stored in
+    UTC and are emitted with an explicit +00:00 offset.
+    """
+
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def dumpb(self, obj):
+        """Serialize obj to UTF-8 bytes, for responses built in pieces"""
+        return orjson.dumps(obj, default=self.default, option=self.option)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype
+        )
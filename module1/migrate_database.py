@@ -6,7 +6,8 @@ This script adds the new columns to existing tables
 
 import sys
 import os
-from sqlalchemy import create_engine, MetaData, Table
+from sqlalchemy import create_engine, inspect, MetaData, Table, text
+from sqlalchemy.dialects.postgresql import ENUM, JSON, JSONB
 from sqlalchemy.exc import OperationalError
 
 # Add the parent directory to the path so we can import the app
@@ -62,12 +63,263 @@ def add_moderation_columns():
         except Exception as e:
             print(f"Migration check failed: {e}")
 
+# Columns that moved from TEXT holding serialized JSON to a JSON column type
+JSON_COLUMNS = {
+    'adaptive_questions': ['options', 'tags', 'learning_objectives'],
+    'assessment_analytics': ['difficulty_progression', 'strength_areas', 'weak_areas'],
+    'auto_grading_models': ['model_config'],
+    'grading_criteria': ['rubric_points', 'keywords'],
+    'auto_grading_results': ['criteria_scores', 'suggestions', 'strengths', 'weaknesses'],
+    'grading_analytics': ['accuracy_trend', 'most_graded_question_types', 'common_feedback_themes'],
+}
+
+def convert_json_columns():
+    """Convert serialized JSON text columns to native JSONB on PostgreSQL"""
+    print("Converting JSON text columns...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        engine = db.engine
+        
+        if engine.dialect.name != 'postgresql':
+            # SQLite/MySQL store the JSON type as text, existing rows load as-is
+            print("✓ Nothing to convert for", engine.dialect.name)
+            return
+        
+        try:
+            # Columns converted on an earlier run are skipped, so the
+            # migration can run on every deploy
+            metadata = MetaData()
+            metadata.reflect(bind=engine, only=[t for t in JSON_COLUMNS if inspect(engine).has_table(t)])
+            with engine.begin() as connection:
+                for table, columns in JSON_COLUMNS.items():
+                    if table not in metadata.tables:
+                        continue
+                    for column in columns:
+                        if isinstance(metadata.tables[table].c[column].type, (JSON, JSONB)):
+                            continue
+                        connection.execute(text(
+                            f"ALTER TABLE {table} ALTER COLUMN {column} "
+                            f"TYPE JSONB USING NULLIF({column}, '')::jsonb"
+                        ))
+                        print(f"✓ {table}.{column} converted to JSONB")
+        except Exception as e:
+            print(f"JSON column conversion failed: {e}")
+
+# String columns that became ENUM types
+ENUM_COLUMNS = {
+    'adaptive_questions': ['question_type', 'difficulty_level'],
+    'auto_grading_models': ['grading_type'],
+    'grading_criteria': ['criteria_type'],
+}
+
+def convert_enum_columns():
+    """Convert string columns to their native ENUM types on PostgreSQL"""
+    print("Converting enum columns...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        engine = db.engine
+        
+        if engine.dialect.name != 'postgresql':
+            # Other databases keep a VARCHAR column, existing rows load as-is
+            print("✓ Nothing to convert for", engine.dialect.name)
+            return
+        
+        try:
+            metadata = MetaData()
+            metadata.reflect(bind=engine, only=[t for t in ENUM_COLUMNS if inspect(engine).has_table(t)])
+            with engine.begin() as connection:
+                for table, columns in ENUM_COLUMNS.items():
+                    if table not in metadata.tables:
+                        continue
+                    for column in columns:
+                        enum_type = db.metadata.tables[table].c[column].type
+                        if isinstance(metadata.tables[table].c[column].type, ENUM):
+                            continue
+                        enum_type.create(bind=connection, checkfirst=True)
+                        connection.execute(text(
+                            f"ALTER TABLE {table} ALTER COLUMN {column} "
+                            f"TYPE {enum_type.name} USING {column}::{enum_type.name}"
+                        ))
+                        print(f"✓ {table}.{column} converted to {enum_type.name}")
+        except Exception as e:
+            print(f"Enum column conversion failed: {e}")
+
+def add_normalized_answer_column():
+    """Add and backfill adaptive_questions.correct_answer_normalized"""
+    print("Adding normalized answer column...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        from adaptive_assessment_models import AdaptiveQuestion
+        engine = db.engine
+        
+        try:
+            metadata = MetaData()
+            metadata.reflect(bind=engine, only=['adaptive_questions'])
+            columns = [c.name for c in metadata.tables['adaptive_questions'].c]
+            if 'correct_answer_normalized' not in columns:
+                with engine.begin() as connection:
+                    connection.execute(text(
+                        "ALTER TABLE adaptive_questions ADD COLUMN correct_answer_normalized TEXT"
+                    ))
+            
+            # Backfill with the same normalization the model applies
+            questions = AdaptiveQuestion.query.filter(AdaptiveQuestion.correct_answer_normalized.is_(None)).all()
+            for question in questions:
+                question.correct_answer_normalized = AdaptiveQuestion.normalize_answer(question.correct_answer)
+            db.session.commit()
+            print(f"✓ Normalized {len(questions)} answers")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Normalized answer column failed: {e}")
+
+def normalize_criteria_keywords():
+    """Drop empty and case-duplicate keywords from existing grading criteria"""
+    print("Normalizing grading criteria keywords...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        from auto_grading_models import GradingCriteria
+        
+        try:
+            changed = 0
+            for criteria in GradingCriteria.query.filter(GradingCriteria.keywords.isnot(None)):
+                keywords = GradingCriteria.normalize_keywords(criteria.keywords)
+                if keywords != criteria.keywords:
+                    criteria.keywords = keywords
+                    changed += 1
+            db.session.commit()
+            print(f"✓ Normalized keywords of {changed} criteria")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Keyword normalization failed: {e}")
+
+# Timestamp columns whose default moved from Python to the database
+SERVER_DEFAULT_TIMESTAMPS = {
+    'auto_grading_models': ['created_at'],
+    'auto_grading_results': ['graded_at'],
+    'human_reviews': ['reviewed_at'],
+    'grading_analytics': ['last_updated'],
+}
+
+def add_timestamp_server_defaults():
+    """Give existing timestamp columns their database-side defaults"""
+    print("Adding timestamp server defaults...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        engine = db.engine
+        
+        if engine.dialect.name != 'postgresql':
+            # SQLite cannot alter a column default. Existing tables keep no
+            # DEFAULT there; the models' Python-side defaults still fill the
+            # columns for every insert made through the app.
+            print("Skipped: column defaults cannot be altered on", engine.dialect.name)
+            return
+        
+        try:
+            with engine.begin() as connection:
+                for table, columns in SERVER_DEFAULT_TIMESTAMPS.items():
+                    for column in columns:
+                        connection.execute(text(
+                            f"ALTER TABLE {table} ALTER COLUMN {column} "
+                            f"SET DEFAULT TIMEZONE('utc', CURRENT_TIMESTAMP)"
+                        ))
+                        print(f"✓ {table}.{column} defaults to the database clock")
+        except Exception as e:
+            print(f"Timestamp default change failed: {e}")
+
+def remove_duplicate_analytics():
+    """Delete duplicate assessment_analytics rows so the scope can be unique"""
+    print("Removing duplicate assessment analytics...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        engine = db.engine
+        
+        try:
+            # Concurrent first requests could insert the same user/course/topic
+            # twice before uq_assessment_analytics_scope existed. The oldest
+            # row is the one the app has been reading, so it is kept.
+            with engine.begin() as connection:
+                deleted = connection.execute(text(
+                    "DELETE FROM assessment_analytics WHERE id NOT IN ("
+                    "SELECT MIN(id) FROM assessment_analytics "
+                    "GROUP BY user_id, COALESCE(course_id, 0), COALESCE(topic_id, 0))"
+                )).rowcount
+            print(f"✓ Removed {deleted} duplicate rows")
+        except Exception as e:
+            print(f"Duplicate analytics removal failed: {e}")
+
+# Indexes that were replaced by wider ones on the models
+OBSOLETE_INDEXES = ['ix_aq_topic_course_active']
+
+def existing_index_names(engine):
+    """Names of the indexes in the database"""
+    if engine.dialect.name == 'sqlite':
+        # SQLite reflection leaves out expression indexes such as
+        # uq_assessment_analytics_scope, so read the catalog directly
+        with engine.connect() as conn:
+            return set(conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+    inspector = inspect(engine)
+    return {index['name']
+            for table in inspector.get_table_names()
+            for index in inspector.get_indexes(table)}
+
+def create_missing_indexes():
+    """Create indexes declared on the models that an existing database lacks"""
+    print("Creating missing indexes...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        engine = db.engine
+        
+        try:
+            with engine.begin() as conn:
+                for name in OBSOLETE_INDEXES:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        except Exception as e:
+            print(f"Obsolete index removal failed: {e}")
+        
+        # Each index on its own, so one failure does not skip the rest
+        existing = existing_index_names(engine)
+        failed = 0
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                try:
+                    # Dialect-specific ones (e.g. PostgreSQL GIN indexes)
+                    # are skipped through their ddl_if
+                    index.create(bind=engine)
+                except Exception as e:
+                    failed += 1
+                    print(f"Index {index.name} creation failed: {e}")
+        if not failed:
+            print("✓ Indexes are up to date")
+
 def main():
     """Main function"""
     print("EduLearn Platform Database Migration Script")
     print("=" * 50)
     
     add_moderation_columns()
+    convert_json_columns()
+    convert_enum_columns()
+    add_normalized_answer_column()
+    normalize_criteria_keywords()
+    add_timestamp_server_defaults()
+    remove_duplicate_analytics()
+    create_missing_indexes()
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,32 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# JSON column type (native JSONB on PostgreSQL, JSON text elsewhere)
+JSONType = db.JSON().with_variant(JSONB(), 'postgresql')
+
+class utcnow(FunctionElement):
+    """Current UTC time as a naive timestamp, computed by the database
+    (usable as a server_default)"""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow, 'postgresql')
+def _postgresql_utcnow(element, compiler, **kw):
+    # now() is in the session time zone; naive timestamps here are UTC
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     
@@ -487,7 +487,7 @@ def get_monthly_analytics():
 
 def initialize_course_progress(user_id, course_id):
     """Initialize course progress for a user"""
-    course = Course.query.get(course_id)
+    course = db.session.get(Course, course_id)
     if not course:
         return None
     
@@ -510,7 +510,7 @@ def initialize_course_progress(user_id, course_id):
 
 def initialize_topic_progress(user_id, topic_id):
     """Initialize topic progress for a user"""
-    topic = Topic.query.get(topic_id)
+    topic = db.session.get(Topic, topic_id)
     if not topic:
         return None
     
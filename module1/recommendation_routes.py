@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, current_app
 from flask_login import login_required, current_user
 from recommendation_models import (
     UserPreference, LearningPattern, UserRecommendation, 
@@ -90,8 +90,7 @@ def get_recommendations():
     
     # Initialize recommendation engine if needed
     if not hasattr(recommendation_engine, 'app'):
-        from app import app
-        recommendation_engine.init_app(app)
+        recommendation_engine.init_app(current_app._get_current_object())
     
     recommendations = []
     
@@ -112,7 +111,7 @@ def get_recommendations():
         content_details = {}
         
         if rec['content_type'] == 'course':
-            course = Course.query.get(rec['content_id'])
+            course = db.session.get(Course, rec['content_id'])
             if course:
                 content_details = {
                     'id': course.id,
@@ -124,7 +123,7 @@ def get_recommendations():
                     'thumbnail_url': course.thumbnail_url
                 }
         elif rec['content_type'] == 'topic':
-            topic = Topic.query.get(rec['content_id'])
+            topic = db.session.get(Topic, rec['content_id'])
             if topic:
                 content_details = {
                     'id': topic.id,
@@ -133,7 +132,7 @@ def get_recommendations():
                     'course_title': topic.course.title if topic.course else None
                 }
         elif rec['content_type'] == 'material':
-            material = LearningMaterial.query.get(rec['content_id'])
+            material = db.session.get(LearningMaterial, rec['content_id'])
             if material:
                 content_details = {
                     'id': material.id,
@@ -315,7 +314,7 @@ def get_similar_content(content_id):
         
         if sim.content_type == 'course':
             from content_models import Course
-            course = Course.query.get(sim.similar_content_id)
+            course = db.session.get(Course, sim.similar_content_id)
             if course:
                 content_details = {
                     'id': course.id,
@@ -325,7 +324,7 @@ def get_similar_content(content_id):
                 }
         elif sim.content_type == 'topic':
             from content_models import Topic
-            topic = Topic.query.get(sim.similar_content_id)
+            topic = db.session.get(Topic, sim.similar_content_id)
             if topic:
                 content_details = {
                     'id': topic.id,
@@ -387,12 +386,21 @@ def recommendation_analytics():
             'message': 'Admin access required'
         }), 403
     
-    # Get recommendation statistics
-    total_recommendations = UserRecommendation.query.count()
-    active_recommendations = UserRecommendation.query.filter_by(is_active=True).count()
-    viewed_recommendations = UserRecommendation.query.filter_by(is_viewed=True).count()
-    clicked_recommendations = UserRecommendation.query.filter_by(is_clicked=True).count()
-    completed_recommendations = UserRecommendation.query.filter_by(is_completed=True).count()
+    # Get recommendation statistics with one SELECT over the table, without
+    # the per-count subquery over every mapped column that Query.count() builds
+    from sqlalchemy import case, func, select
+    
+    def count_where(flag):
+        return func.coalesce(func.sum(case((flag == True, 1), else_=0)), 0)
+    
+    (total_recommendations, active_recommendations, viewed_recommendations,
+     clicked_recommendations, completed_recommendations) = db.session.execute(select(
+        func.count(),
+        count_where(UserRecommendation.is_active),
+        count_where(UserRecommendation.is_viewed),
+        count_where(UserRecommendation.is_clicked),
+        count_where(UserRecommendation.is_completed)
+    ).select_from(UserRecommendation)).one()
     
     # Calculate engagement rates
     view_rate = (viewed_recommendations / total_recommendations * 100) if total_recommendations > 0 else 0
@@ -400,7 +408,6 @@ def recommendation_analytics():
     completion_rate = (completed_recommendations / total_recommendations * 100) if total_recommendations > 0 else 0
     
     # Get recommendations by type
-    from sqlalchemy import func
     recommendations_by_type = db.session.query(
         UserRecommendation.recommendation_type,
         func.count(UserRecommendation.id)
@@ -484,7 +491,7 @@ def get_content_details(content_id, content_type):
     """Helper function to get content details"""
     if content_type == 'course':
         from content_models import Course
-        course = Course.query.get(content_id)
+        course = db.session.get(Course, content_id)
         if course:
             return {
                 'id': course.id,
@@ -496,7 +503,7 @@ def get_content_details(content_id, content_type):
             }
     elif content_type == 'topic':
         from content_models import Topic
-        topic = Topic.query.get(content_id)
+        topic = db.session.get(Topic, content_id)
         if topic:
             return {
                 'id': topic.id,
@@ -507,7 +514,7 @@ def get_content_details(content_id, content_type):
             }
     elif content_type == 'material':
         from content_models import LearningMaterial
-        material = LearningMaterial.query.get(content_id)
+        material = db.session.get(LearningMaterial, content_id)
         if material:
             return {
                 'id': material.id,
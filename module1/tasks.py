@@ -0,0 +1,163 @@
+"""
+Background jobs for work that should not hold up a request.
+
+Jobs run in a small thread pool inside an application context of the app
+that submitted them, with their own database session. Their status is kept in memory per process.
+"""
+
+import csv
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.orm import lazyload
+from werkzeug.security import generate_password_hash
+from models import db, User
+from adaptive_assessment_models import AdaptiveQuestion, AdaptiveAssessment, AssessmentAnalytics
+from auto_grading_models import GradingAnalytics
+from caching import cache
+
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='edulearn-job')
+
+# job id -> {'status': pending|running|finished|failed, 'result': ..., 'error': ...}
+jobs = OrderedDict()
+MAX_TRACKED_JOBS = 1000
+
+def submit(func, *args, **kwargs):
+    """Run func(*args, **kwargs) in the background and return the job id"""
+    app = current_app._get_current_object()
+    job_id = uuid.uuid4().hex
+    jobs[job_id] = {'status': 'pending', 'result': None, 'error': None}
+    while len(jobs) > MAX_TRACKED_JOBS:
+        jobs.popitem(last=False)
+    
+    def run():
+        job = jobs.get(job_id, {})
+        job['status'] = 'running'
+        with app.app_context():
+            try:
+                job['result'] = func(*args, **kwargs)
+                job['status'] = 'finished'
+            except Exception as e:
+                db.session.rollback()
+                job['error'] = str(e)
+                job['status'] = 'failed'
+    
+    executor.submit(run)
+    return job_id
+
+def get_job(job_id):
+    """Return the status record of a job, or None if it is unknown"""
+    return jobs.get(job_id)
+
+def bulk_create_users_from_csv(path):
+    """Create users from an uploaded CSV file (username, email, role[,
+    first_name, last_name] after a header row) and delete the file"""
+    try:
+        rows = []
+        with open(path, encoding='utf-8', newline='') as f:
+            csv_input = csv.reader(f)
+            
+            # Skip header row
+            next(csv_input, None)
+            
+            for row in csv_input:
+                if len(row) >= 3:  # username, email, role
+                    username = row[0].strip()
+                    email = row[1].strip().lower()
+                    role = row[2].strip().lower()
+                    
+                    # Optional fields
+                    first_name = row[3].strip() if len(row) > 3 else ''
+                    last_name = row[4].strip() if len(row) > 4 else ''
+                    
+                    # Validate role
+                    if role not in ['student', 'teacher', 'admin']:
+                        role = 'student'
+                    
+                    rows.append((username, email, role, first_name, last_name))
+    finally:
+        os.remove(path)
+    
+    # Users get the default password, which should be changed by the user
+    result = bulk_create_users(rows)
+    result['rows'] = len(rows)
+    return result
+
+def bulk_create_users(rows, default_password='Password123!', chunk_size=1000):
+    """Create users from (username, email, role, first_name, last_name) rows,
+    skipping emails and usernames that are already taken"""
+    emails = {row[1] for row in rows}
+    usernames = {row[0] for row in rows}
+    
+    # One query each for the existing emails/usernames instead of one per row
+    taken_emails = {email for (email,) in db.session.query(User.email).filter(User.email.in_(emails))}
+    taken_usernames = {name for (name,) in db.session.query(User.username).filter(User.username.in_(usernames))}
+    
+    # Every new user gets the same default password, so hash it once
+    # instead of running the KDF for each row
+    default_hash = generate_password_hash(default_password)
+    
+    new_users = []
+    for username, email, role, first_name, last_name in rows:
+        if email in taken_emails or username in taken_usernames:
+            continue
+        taken_emails.add(email)
+        taken_usernames.add(username)
+        new_users.append({
+            'username': username,
+            'email': email,
+            'role': role,
+            'first_name': first_name,
+            'last_name': last_name,
+            'password_hash': default_hash
+        })
+    
+    # Multi-row INSERTs, committed chunk by chunk
+    for start in range(0, len(new_users), chunk_size):
+        db.session.execute(insert(User), new_users[start:start + chunk_size])
+        db.session.commit()
+    
+    return {'created_users': len(new_users)}
+
+def update_question_statistics(question_id, is_correct, response_time):
+    """Count one answer in a question's statistics"""
+    # A single UPDATE computed from the current column values, so concurrent
+    # jobs for the same question cannot overwrite each other's counts
+    times_used = AdaptiveQuestion.times_used + 1
+    db.session.execute(
+        update(AdaptiveQuestion)
+        .where(AdaptiveQuestion.id == question_id)
+        .values(
+            times_used=times_used,
+            correct_responses=AdaptiveQuestion.correct_responses + (1 if is_correct else 0),
+            average_response_time=AdaptiveQuestion.average_response_time
+                + (response_time - AdaptiveQuestion.average_response_time) / times_used
+        )
+    )
+    db.session.commit()
+
+def update_user_analytics(assessment_id, stale_cache_key=None):
+    """Fold an assessment into its user's analytics and drop the cached view"""
+    # The totals come from SQL aggregates in recompute(), so skip the
+    # selectin load of every response row
+    assessment = db.session.get(AdaptiveAssessment, assessment_id,
+                                options=[lazyload(AdaptiveAssessment.responses)])
+    if assessment is None:
+        return None
+    
+    analytics = AssessmentAnalytics.get_or_create(assessment.user_id, assessment.course_id, assessment.topic_id)
+    analytics.record_assessment(assessment)
+    db.session.commit()
+    
+    if stale_cache_key:
+        cache.delete(stale_cache_key)
+    return analytics.to_dict()
+
+def refresh_grading_analytics(model_ids):
+    """Recompute the analytics of the grading models that just graded responses"""
+    for model_id in model_ids:
+        GradingAnalytics.refresh(model_id)
+    db.session.commit()
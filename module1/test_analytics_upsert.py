@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for AssessmentAnalytics.get_or_create and the analytics migration
+Runs against a throwaway SQLite database, no server needed
+"""
+
+import os
+import sys
+import tempfile
+
+# The database must be chosen before config is imported
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'analytics_test.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from app import create_app, init_db
+from models import db
+from adaptive_assessment_models import AssessmentAnalytics
+import migrate_database
+
+app = create_app()
+
+def reset_database():
+    """Fresh tables, as `flask init-db` creates them"""
+    with app.app_context():
+        db.drop_all()
+        init_db()
+
+def insert_raw_analytics(connection, user_id):
+    connection.execute(text(
+        "INSERT INTO assessment_analytics (user_id, total_assessments, completed_assessments, "
+        "average_score, best_score, total_questions_answered, total_correct_answers, "
+        "total_time_spent_minutes, average_time_per_question) VALUES (:user_id, 0, 0, 0, 0, 0, 0, 0, 0)"
+    ), {'user_id': user_id})
+
+def test_get_or_create_is_idempotent():
+    reset_database()
+    with app.app_context():
+        first = AssessmentAnalytics.get_or_create(1)
+        again = AssessmentAnalytics.get_or_create(1)
+        scoped = AssessmentAnalytics.get_or_create(1, course_id=2, topic_id=3)
+        db.session.commit()
+
+        assert first.id == again.id
+        assert scoped.id != first.id
+        assert AssessmentAnalytics.get_or_create(1, course_id=2, topic_id=3).id == scoped.id
+        assert AssessmentAnalytics.query.count() == 2
+
+def test_unique_scope_rejects_duplicates():
+    reset_database()
+    with app.app_context():
+        AssessmentAnalytics.get_or_create(1)
+        db.session.commit()
+        try:
+            with db.engine.begin() as connection:
+                insert_raw_analytics(connection, 1)
+        except Exception:
+            pass
+        else:
+            raise AssertionError('duplicate user/course/topic row was accepted')
+
+def test_get_or_create_without_unique_index():
+    """A database the migration has not reached yet, holding duplicates"""
+    reset_database()
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP INDEX uq_assessment_analytics_scope"))
+            insert_raw_analytics(connection, 1)
+            insert_raw_analytics(connection, 1)
+
+        oldest = min(a.id for a in AssessmentAnalytics.query.filter_by(user_id=1))
+        assert AssessmentAnalytics.get_or_create(1).id == oldest
+        # New scopes still get a row through SELECT-then-INSERT
+        created = AssessmentAnalytics.get_or_create(2)
+        db.session.commit()
+        assert created.id is not None
+        assert AssessmentAnalytics.query.filter_by(user_id=2).count() == 1
+
+def test_migration_removes_duplicates_and_creates_index():
+    reset_database()
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP INDEX uq_assessment_analytics_scope"))
+            for _ in range(3):
+                insert_raw_analytics(connection, 1)
+            insert_raw_analytics(connection, 2)
+
+    migrate_database.remove_duplicate_analytics()
+    migrate_database.create_missing_indexes()
+
+    with app.app_context():
+        assert AssessmentAnalytics.query.filter_by(user_id=1).count() == 1
+        assert AssessmentAnalytics.query.filter_by(user_id=2).count() == 1
+        assert 'uq_assessment_analytics_scope' in migrate_database.existing_index_names(db.engine)
+        # The upsert works again once the index is back
+        assert AssessmentAnalytics.get_or_create(1).id == AssessmentAnalytics.get_or_create(1).id
+
+if __name__ == '__main__':
+    print("Testing assessment analytics get_or_create...")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print(f"✓ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"✗ {name}: {e!r}")
+    sys.exit(1 if failed else 0)
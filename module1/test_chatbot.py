@@ -15,10 +15,15 @@ config = Config()
 # Configure Gemini API
 genai.configure(api_key=config.GEMINI_API_KEY)
 
+# generate_response reads the app config and response cache
+from app import create_app
+app = create_app()
+
 # Test the chatbot response generation
 try:
     test_message = "Hello, how can you help me with my studies?"
-    response = generate_response(test_message)
+    with app.app_context():
+        response = generate_response(test_message)
     print("Chatbot response test successful!")
     print("Test message:", test_message)
     print("Response:", response)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test script for the code grader's syntax score and grading criteria keywords
+No database or server needed
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from auto_grading_models import GradingCriteria, grading_engine
+
+def syntax_score(code):
+    return grading_engine._check_code_syntax(code)
+
+def test_python_is_scored_from_its_ast():
+    assert syntax_score("def add(a, b):\n    return a + b\n") == 9.0
+    assert syntax_score("def log(message):\n    print(message)\n") == 7.0
+    assert syntax_score("total = 1 + 2\n") == 5.0
+    # Keywords inside strings or comments are not structure
+    assert syntax_score("# def helper(): return 1\nx = 'def return'\n") == 5.0
+
+def test_code_that_does_not_parse_keeps_the_keyword_check():
+    # Other languages
+    assert syntax_score("function add(a, b) { return a + b; }") == 5.0
+    assert syntax_score("(def add [a b] (return (+ a b)))") == 9.0
+    # Python with a syntax error
+    assert syntax_score("def add(a, b)\n    return a + b\n") == 9.0
+    assert syntax_score("def add(a, b)\n    print(a + b\n") == 7.0
+
+def test_empty_code():
+    assert syntax_score('') == 5.0
+    assert syntax_score(None) == 5.0
+
+def test_keywords_are_stored_as_scored():
+    keywords = ['Loop', '', 'loop', 'index', 'LOOP', None]
+    assert GradingCriteria.normalize_keywords(keywords) == ['Loop', 'index']
+    assert GradingCriteria.normalize_keywords(None) == []
+
+if __name__ == '__main__':
+    print("Testing code grading...")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print(f"✓ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"✗ {name}: {e!r}")
+    sys.exit(1 if failed else 0)
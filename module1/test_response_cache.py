@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the chatbot's Gemini response cache
+Gemini is replaced by a fake model, so no API key or network is needed
+"""
+
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# The database must be chosen before config is imported
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'chat_test.db')}"
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gemini import ResponseCache, normalize_message
+import chatbot_routes
+from app import create_app
+
+class FakeChatModel:
+    """Stands in for the Gemini model and records what it was asked"""
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_content(self, message, **kwargs):
+        self.calls.append(message)
+        return SimpleNamespace(text=f'ANSWER for: {message}')
+
+def test_normalize_message():
+    assert normalize_message('  What IS recursion?? ') == 'what is recursion'
+    assert normalize_message('what is\trecursion') == 'what is recursion'
+    assert normalize_message('recursion in Python') != normalize_message('recursion in Haskell')
+
+def test_hit_and_miss():
+    cache = ResponseCache(10)
+    assert cache.get((1, 'hello')) is None
+    cache.add((1, 'hello'), 'hi')
+    assert cache.get((1, 'hello')) == 'hi'
+    # Other users and other messages miss
+    assert cache.get((2, 'hello')) is None
+    assert cache.get((1, 'hello there')) is None
+
+def test_least_recently_used_is_evicted():
+    cache = ResponseCache(2)
+    cache.add('a', 'A')
+    cache.add('b', 'B')
+    assert cache.get('a') == 'A'  # 'b' is now the least recently used
+    cache.add('c', 'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+    # Every new entry is kept, not just the first one after filling up
+    cache.add('d', 'D')
+    assert cache.get('d') == 'D'
+    assert cache.get('a') is None
+
+def test_generate_response_uses_cache():
+    app = create_app()
+    model = FakeChatModel()
+    get_chat_model = chatbot_routes.get_chat_model
+    chatbot_routes.get_chat_model = lambda: model
+    try:
+        with app.app_context():
+            python = 'Show me a recursion example in Python'
+            haskell = 'Show me a recursion example in Haskell'
+
+            assert chatbot_routes.generate_response(python, 1) == f'ANSWER for: {python}'
+            # The same question again, differently typed, is served from the cache
+            assert chatbot_routes.generate_response('show me a recursion example in python!', 1) == f'ANSWER for: {python}'
+            assert len(model.calls) == 1
+
+            # A one-word difference is a different question
+            assert chatbot_routes.generate_response(haskell, 1) == f'ANSWER for: {haskell}'
+            assert len(model.calls) == 2
+
+            # Another user's reply is not shared
+            chatbot_routes.generate_response(python, 2)
+            assert len(model.calls) == 3
+    finally:
+        chatbot_routes.get_chat_model = get_chat_model
+
+if __name__ == '__main__':
+    print("Testing chatbot response cache...")
+    print("=" * 50)
+    failed = 0
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            try:
+                test()
+                print(f"✓ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"✗ {name}: {e!r}")
+    sys.exit(1 if failed else 0)